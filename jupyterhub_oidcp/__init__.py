@@ -28,6 +28,27 @@ def _services_to_dict(services: List[dict]) -> List[dict]:
     return [x for x in r if x is not None]
 
 
+def _issuer_to_dict(issuer: dict) -> dict:
+    """
+    Convert an issuer to a dictionary.
+    """
+    if 'prefix' not in issuer:
+        raise ValueError("Issuer must have a 'prefix' key.")
+    if 'services' not in issuer:
+        raise ValueError("Issuer must have a 'services' key.")
+    r = {
+        "prefix": issuer['prefix'],
+        "services": _services_to_dict(issuer['services']),
+    }
+    for key in [
+        'issuer', 'vault_path', 'email_pattern',
+        'admin_email_pattern', 'user_email_pattern',
+    ]:
+        if key in issuer:
+            r[key] = issuer[key]
+    return r
+
+
 def configure_jupyterhub_oidcp(
     c,
     issuer: Optional[str] = None,
@@ -40,20 +61,53 @@ def configure_jupyterhub_oidcp(
     admin_email_pattern: Optional[str] = None,
     user_email_pattern: Optional[str] = None,
     oauth_client_allowed_scopes=["inherit"],
-    debug=False
+    debug=False,
+    log_sample_rate: Optional[float] = None,
+    config_file: Optional[str] = None,
+    unix_socket: Optional[str] = None,
+    advertise_unix_socket: bool = False,
+    unix_socket_mode: Optional[int] = None,
+    issuers: Optional[List[dict]] = None,
+    service_name: str = "oidcp",
+    max_queue_delay: Optional[float] = None,
+    revocation_index_path: Optional[str] = None,
+    user_sync_interval: Optional[float] = None,
 ):
     """
     Add the OIDC service to the JupyterHub configuration.
-    """
-    service_name = "oidcp"
-    services_def = json.dumps(_services_to_dict(services))
 
+    With config_file, the clients, issuers, vault paths and email patterns
+    are read from that file, and read again on SIGHUP. They must not be
+    passed as arguments as well, since command line options take
+    precedence over the file.
+    """
     service_command = [
         sys.executable,
         "-m", "jupyterhub_oidcp.main",
-        "--services", services_def,
         "--port", str(port),
     ]
+    if config_file:
+        reloadable = dict(
+            services=services,
+            issuers=issuers,
+            vault_path=vault_path,
+            email_pattern=email_pattern,
+            admin_email_pattern=admin_email_pattern,
+            user_email_pattern=user_email_pattern,
+        )
+        conflicts = [k for k, v in reloadable.items() if v]
+        if conflicts:
+            raise ValueError(
+                "Set these in the config file instead when config_file is "
+                f"used: {', '.join(conflicts)}"
+            )
+        service_command.extend([
+            "--config", config_file,
+        ])
+    else:
+        service_command.extend([
+            "--services", json.dumps(_services_to_dict(services)),
+        ])
     if issuer:
         service_command.extend([
             "--issuer", issuer,
@@ -66,6 +120,22 @@ def configure_jupyterhub_oidcp(
         service_command.extend([
             "--internal-base-url", internal_base_url,
         ])
+    if unix_socket:
+        service_command.extend([
+            "--unix-socket", unix_socket,
+        ])
+        if unix_socket_mode is not None:
+            service_command.extend([
+                "--unix-socket-mode", format(unix_socket_mode, "o"),
+            ])
+        if advertise_unix_socket:
+            service_command.extend([
+                "--advertise-unix-socket",
+            ])
+    if issuers:
+        service_command.extend([
+            "--issuers", json.dumps([_issuer_to_dict(i) for i in issuers]),
+        ])
     if vault_path:
         service_command.extend([
             "--vault-path", vault_path,
@@ -83,6 +153,23 @@ def configure_jupyterhub_oidcp(
             "--user-email-pattern", user_email_pattern,
         ])
 
+    if max_queue_delay is not None:
+        service_command.extend([
+            "--max-queue-delay", str(max_queue_delay),
+        ])
+    if log_sample_rate is not None:
+        service_command.extend([
+            "--log-sample-rate", str(log_sample_rate),
+        ])
+    if revocation_index_path:
+        service_command.extend([
+            "--revocation-index-path", revocation_index_path,
+        ])
+    if user_sync_interval:
+        service_command.extend([
+            "--user-sync-interval", str(user_sync_interval),
+        ])
+
     if debug:
         service_command.extend([
             "--debug"
@@ -99,3 +186,10 @@ def configure_jupyterhub_oidcp(
     if oauth_client_allowed_scopes is not None:
         service["oauth_client_allowed_scopes"] = oauth_client_allowed_scopes
     c.JupyterHub.services.append(service)
+    if user_sync_interval:
+        # Looking up users in the Hub API requires the read:users scope
+        c.JupyterHub.load_roles.append({
+            "name": f"{service_name}-user-sync",
+            "scopes": ["read:users"],
+            "services": [service_name],
+        })
@@ -0,0 +1,56 @@
+from typing import Iterable, Optional
+
+from .metrics import SHED_REQUESTS
+
+
+class AdmissionController:
+    """
+    Decide whether to accept a request based on the load of the server.
+
+    The load is measured by the lag of the event loop, as sampled by
+    `LoopWatchdog`. While the loop is busy, new connections wait in the
+    socket backlog where the handlers cannot see them: the time of a
+    request only starts once its headers have been read. They still delay
+    the loop, so its lag reflects them. The number of in-flight requests
+    is not a useful signal either: the handlers are synchronous, so the
+    event loop runs one request at a time from start to finish.
+    """
+
+    def __init__(
+        self,
+        max_queue_delay: float = 0.0,
+        shed_endpoint_classes: Iterable[str] = ("expensive",),
+        retry_after: int = 1,
+    ):
+        """
+        Initialize the admission controller.
+
+        :param max_queue_delay: The event loop lag in seconds above which
+            requests are shed. 0 disables the limit.
+        :param shed_endpoint_classes: The endpoint classes that may be shed.
+        :param retry_after: The value of the Retry-After header for shed
+            requests.
+        """
+        self.max_queue_delay = max_queue_delay
+        self.shed_endpoint_classes = set(shed_endpoint_classes)
+        self.retry_after = retry_after
+        self.shed_counts = {}
+
+    def admit(self, endpoint_class: str, lag: float) -> Optional[str]:
+        """
+        Decide whether to accept a request.
+
+        :param endpoint_class: The endpoint class of the request.
+        :param lag: The current lag of the event loop in seconds.
+        :return: None if the request is accepted, or the reason for
+            shedding it.
+        """
+        if endpoint_class not in self.shed_endpoint_classes:
+            return None
+        if not self.max_queue_delay or lag <= self.max_queue_delay:
+            return None
+        reason = "queue_delay"
+        key = (endpoint_class, reason)
+        self.shed_counts[key] = self.shed_counts.get(key, 0) + 1
+        SHED_REQUESTS.labels(endpoint_class, reason).inc()
+        return reason
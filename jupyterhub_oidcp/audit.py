@@ -0,0 +1,198 @@
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+from .metrics import DROPPED_LOG_RECORDS
+
+
+AUDIT_LOGGER_NAME = "jupyterhub_oidcp.audit"
+REDACTED = "[REDACTED]"
+
+audit_logger = logging.getLogger(AUDIT_LOGGER_NAME)
+_exception_formatter = logging.Formatter()
+
+_SENSITIVE_KEY_RE = re.compile(
+    r"(secret|password|passwd|cookie|authorization|api_key|api_token|"
+    r"access_token|refresh_token|id_token|^token$|^code$|"
+    r"^d$|^k$|^p$|^q$|^dp$|^dq$|^qi$)",
+    re.IGNORECASE,
+)
+_SENSITIVE_TEXT_RES = [
+    re.compile(
+        r"(\b(?:access_token|refresh_token|id_token|client_secret|api_token|"
+        r"password|code|token)[\"']?\s*[=:]\s*[\"']?)([^&\s\"',}]+)",
+        re.IGNORECASE,
+    ),
+    re.compile(r"(\b(?:Bearer|Basic)\s+)([A-Za-z0-9._~+/=-]+)"),
+    re.compile(r"(jupyterhub:)(\{[^}]*\})"),
+]
+
+
+def is_sensitive_key(key: str) -> bool:
+    """
+    Whether a field with the given name holds a secret.
+    """
+    return bool(_SENSITIVE_KEY_RE.search(str(key)))
+
+
+def redact_text(text: str) -> str:
+    """
+    Mask secrets embedded in a free-form string.
+    """
+    for pattern in _SENSITIVE_TEXT_RES:
+        text = pattern.sub(lambda m: m.group(1) + REDACTED, text)
+    return text
+
+
+def redact(value: Any) -> Any:
+    """
+    Return a copy of a value with secrets masked.
+    """
+    if isinstance(value, dict):
+        return {
+            k: (REDACTED if is_sensitive_key(k) else redact(v))
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return redact_text(value)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return redact_text(str(value))
+
+
+def audit_event(event: str, **fields):
+    """
+    Emit a security-relevant audit record.
+
+    Audit records bypass sampling and are never dropped by the pipeline.
+
+    :param event: The event name, e.g. "token_issued".
+    :param fields: Additional structured fields for the record.
+    """
+    audit_logger.info(event, extra={"audit": True, "audit_fields": fields})
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format log records as single-line JSON documents with secrets redacted.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)
+            ) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact_text(record.getMessage()),
+        }
+        if getattr(record, "audit", False):
+            doc["audit"] = True
+            doc.update(redact(getattr(record, "audit_fields", {})))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            doc["exc_info"] = redact_text(record.exc_text)
+        return json.dumps(doc, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of high-volume records.
+
+    Records at WARNING or above and audit records are always kept.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0:
+            return True
+        if record.levelno >= logging.WARNING:
+            return True
+        if getattr(record, "audit", False):
+            return True
+        return random.random() < self.rate
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    A QueueHandler that drops records other than audit records when the
+    queue is full, instead of growing without bound.
+
+    Only records that pass the level check and the filters are prepared,
+    so sampled-out records are never formatted.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Interpolate now: the arguments may change or be freed before
+        # the listener thread gets to the record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(
+                record.exc_info
+            )
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if getattr(record, "audit", False):
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED_LOG_RECORDS.inc()
+
+
+def configure_logging(
+    level: int,
+    sample_rate: float = 1.0,
+    stream=None,
+    filename: Optional[str] = None,
+    queue_size: int = 10000,
+) -> QueueListener:
+    """
+    Route all logging through a queue drained by a background thread.
+
+    :param level: The root logging level.
+    :param sample_rate: Fraction of sub-WARNING, non-audit records to keep.
+    :param stream: The stream to write to. Defaults to stderr.
+    :param filename: Write to this file instead of a stream.
+    :param queue_size: The number of records waiting to be written above
+        which records other than audit records are dropped.
+    :return: The started listener. Call stop() to flush on shutdown.
+    """
+    if filename:
+        output = logging.FileHandler(filename)
+    else:
+        output = logging.StreamHandler(stream)
+    output.setFormatter(JSONFormatter())
+
+    log_queue = queue.Queue(queue_size)
+    handler = BoundedQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(handler)
+    root.setLevel(level)
+    # Audit records must not be filtered out by a restrictive root level
+    audit_logger.setLevel(logging.INFO)
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,85 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+
+from .audit import redact
+
+
+logger = logging.getLogger(__name__)
+_STOP = object()
+
+
+class TrafficRecorder:
+    """
+    Write a sanitized trace of the handled requests as JSON lines.
+
+    Entries are handed to a queue and written by a background thread,
+    so recording does not block the request handlers.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the recorder.
+
+        :param path: The path of the trace file. Entries are appended.
+        """
+        self.path = path
+        # Fingerprints are only comparable within one capture and cannot
+        # be reversed or checked against a known token without the key
+        self._key = os.urandom(32)
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self):
+        """
+        Start the writer thread.
+        """
+        self._thread = threading.Thread(
+            target=self._write,
+            name="oidcp-capture",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info("Capturing traffic to %s", self.path)
+
+    def stop(self):
+        """
+        Write the pending entries and stop the writer thread.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def record(self, entry: dict):
+        """
+        Record a request. Secrets in the request parameters are redacted.
+
+        :param entry: The request entry. See BaseOIDHandler._capture.
+        """
+        entry["params"] = redact(entry.get("params", {}))
+        self._queue.put(entry)
+
+    def fingerprint(self, value: str) -> str:
+        """
+        Get an opaque identifier of a code or token, so the replay can
+        tell which request used the code or token issued by another.
+        """
+        return hmac.new(
+            self._key, value.encode("utf-8"), hashlib.sha256
+        ).hexdigest()[:16]
+
+    def _write(self):
+        with open(self.path, "a") as f:
+            while True:
+                entry = self._queue.get()
+                if entry is _STOP:
+                    break
+                f.write(json.dumps(entry) + "\n")
+                if self._queue.empty():
+                    f.flush()
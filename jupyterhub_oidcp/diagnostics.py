@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import sys
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Optional
+
+from .provider import HubOAuthProvider
+from .userstore import UserStore
+
+
+logger = logging.getLogger(__name__)
+# The report runs on the event loop, so the number of objects walked is
+# bounded regardless of the size of the structures
+SAMPLE_ENTRIES = 100
+MAX_OBJECTS = 10000
+# The tracemalloc report walks every traced allocation, so it runs in a
+# thread, one at a time
+MAX_TOP_ALLOCATIONS = 100
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+def approx_size(
+    obj,
+    max_depth: int = 8,
+    max_objects: int = MAX_OBJECTS,
+) -> int:
+    """
+    Get the approximate size in bytes of an object and the objects
+    it refers to through containers and instance attributes.
+
+    :param obj: The object to measure.
+    :param max_depth: The maximum depth of references to follow.
+    :param max_objects: The maximum number of objects to measure.
+    """
+    seen = set()
+    size = 0
+    stack = [(obj, 0)]
+    while stack and len(seen) < max_objects:
+        o, depth = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o, 0)
+        if depth >= max_depth or isinstance(o, (str, bytes, int, float)):
+            continue
+        if isinstance(o, dict):
+            for k, v in o.items():
+                stack.append((k, depth + 1))
+                stack.append((v, depth + 1))
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            for v in o:
+                stack.append((v, depth + 1))
+        elif hasattr(o, "__dict__") and not isinstance(o, type):
+            stack.append((vars(o), depth + 1))
+    return size
+
+
+def _stats(container) -> dict:
+    """
+    Count the entries of a container and estimate its size from a sample
+    of SAMPLE_ENTRIES entries.
+    """
+    if container is None:
+        return {"entries": 0, "bytes": 0, "sampled": 0}
+    entries = len(container)
+    if isinstance(container, dict):
+        sample = list(islice(container.items(), SAMPLE_ENTRIES))
+    else:
+        sample = list(islice(container, SAMPLE_ENTRIES))
+    size = sys.getsizeof(container, 0)
+    if sample:
+        sampled = sum(approx_size(entry) for entry in sample)
+        size += sampled * entries // len(sample)
+    return {"entries": entries, "bytes": size, "sampled": len(sample)}
+
+
+class MemoryDiagnostics:
+    """
+    Report the memory used by the provider's own structures and,
+    when tracemalloc is enabled, the top allocation sites.
+    """
+
+    def __init__(
+        self,
+        providers: Dict[str, HubOAuthProvider],
+        userstore: UserStore,
+        frames: int = 0,
+    ):
+        """
+        Initialize the diagnostics.
+
+        :param providers: The providers by issuer prefix.
+        :param userstore: The user store shared by the providers.
+        :param frames: The number of frames tracemalloc stores per
+            allocation. 0 disables tracemalloc.
+        """
+        self.providers = providers
+        self.userstore = userstore
+        self.frames = frames
+        self.baseline = None
+        self._executor = ThreadPoolExecutor(
+            1, thread_name_prefix="oidcp-tracemalloc"
+        )
+        self._running = False
+        if frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info("Started tracemalloc with %d frames", frames)
+
+    async def _run_in_thread(self, func, *args):
+        if self._running:
+            raise RuntimeError("A tracemalloc report is already running.")
+        self._running = True
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self._running = False
+
+    async def take_snapshot(self):
+        """
+        Take a snapshot to compare the next reports with.
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not enabled.")
+        self.baseline = await self._run_in_thread(_take_snapshot)
+
+    def structures(self) -> dict:
+        """
+        Get the entry counts and approximate sizes of the session DBs,
+        client DBs, key bundles and the user store. Sizes are extrapolated
+        from a sample of the entries.
+        """
+        users = getattr(self.userstore, "users", None)
+        r = {"userstore": _stats(users), "issuers": {}}
+        for prefix, provider in self.providers.items():
+            sessions = getattr(provider.sdb._db, "storage", None)
+            keybundles = [
+                kb
+                for kbs in provider.keyjar.issuer_keys.values()
+                for kb in kbs
+            ]
+            r["issuers"][prefix] = {
+                "session_db": _stats(sessions),
+                "client_db": _stats(provider.cdb.services),
+                "key_bundles": {
+                    "entries": len(keybundles),
+                    # KeyBundle.keys() may fetch remote keys, so count
+                    # the cached ones only
+                    "keys": sum(len(kb._keys) for kb in keybundles),
+                    "bytes": approx_size(provider.keyjar),
+                },
+            }
+        return r
+
+    async def top_allocations(
+        self,
+        limit: int = 20,
+        key_type: str = "lineno",
+    ) -> Optional[dict]:
+        """
+        Get the top allocation sites, compared with the last snapshot
+        if one was taken.
+
+        :param limit: The number of allocation sites to report, at most
+            MAX_TOP_ALLOCATIONS.
+        :param key_type: How to group allocations: "lineno", "filename"
+            or "traceback".
+        :return: None if tracemalloc is not enabled.
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        return await self._run_in_thread(
+            _top_allocations,
+            self.baseline,
+            min(limit, MAX_TOP_ALLOCATIONS),
+            key_type,
+        )
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def _top_allocations(
+    baseline: Optional[tracemalloc.Snapshot],
+    limit: int,
+    key_type: str,
+) -> dict:
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = _take_snapshot()
+    if baseline is not None:
+        stats = snapshot.compare_to(baseline, key_type)
+    else:
+        stats = snapshot.statistics(key_type)
+    top = []
+    for stat in stats[:limit]:
+        entry = {
+            "size": stat.size,
+            "count": stat.count,
+            "traceback": stat.traceback.format(),
+        }
+        if baseline is not None:
+            entry["size_diff"] = stat.size_diff
+            entry["count_diff"] = stat.count_diff
+        top.append(entry)
+    return {
+        "traced_current": current,
+        "traced_peak": peak,
+        "frames": tracemalloc.get_traceback_limit(),
+        "compared_to_snapshot": baseline is not None,
+        "top": top,
+    }
@@ -4,3 +4,6 @@ from .authorization import AuthorizationHandler
 from .token import TokenHandler
 from .jwks import JwksHandler
 from .userinfo import UserInfoHandler
+from .metrics import MetricsHandler
+from .diagnostics import MemoryDiagnosticsHandler, LoopDiagnosticsHandler
+from .revocation import RevocationHandler
@@ -2,11 +2,14 @@ from jupyterhub.services.auth import HubOAuthenticated
 from tornado import web
 
 from .base import BaseOIDHandler
+from ..audit import audit_event
 from ..provider import HubOAuthAuthnMethod
 from ..userstore import UserInfo
 
 
 class AuthorizationHandler(HubOAuthenticated, BaseOIDHandler):
+    endpoint_class = "expensive"
+
     @web.authenticated
     def get(self):
         resp = self.provider.authorization_endpoint(
@@ -16,7 +19,15 @@ class AuthorizationHandler(HubOAuthenticated, BaseOIDHandler):
             )
         )
         user = self.get_current_user()
-        self.log.debug(f"AuthorizationHandler.get: {resp}, user={user}")
+        self.log.debug("AuthorizationHandler.get: %s, user=%s",
+                       resp, user.get("name"))
         userinfo = UserInfo.from_huboauth_user(user)
         self.userstore.set_user(userinfo)
+        if resp.status_code in (302, 303) and 'code=' in resp.message:
+            audit_event(
+                "code_issued",
+                user=userinfo.uid,
+                client_id=self.get_query_argument('client_id', None),
+                remote_ip=self.request.remote_ip,
+            )
         self.finish_response(resp)
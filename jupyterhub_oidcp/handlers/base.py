@@ -1,3 +1,11 @@
+import base64
+import binascii
+import json
+import time
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from jupyterhub.services.auth import HubOAuthenticated
 from oic.oic.provider import Provider
 from oic.utils.http_util import Response
 from tornado import web
@@ -7,6 +15,9 @@ from ..userstore import UserStore
 
 
 class BaseOIDHandler(web.RequestHandler):
+    # Admission control sheds "expensive" requests first
+    endpoint_class = "default"
+
     @property
     def log(self):
         return self.settings.get('log', app_log)
@@ -14,8 +25,151 @@ class BaseOIDHandler(web.RequestHandler):
     def initialize(self, provider: Provider, userstore: UserStore):
         self.provider = provider
         self.userstore = userstore
+        self._tracked = False
+        self._captured_response = None
+
+    @property
+    def admission(self):
+        return self.settings.get('admission', None)
+
+    @property
+    def watchdog(self):
+        return self.settings.get('watchdog', None)
+
+    @property
+    def traffic_recorder(self):
+        return self.settings.get('traffic_recorder', None)
+
+    @property
+    def revocation_index(self):
+        return self.settings.get('revocation_index', None)
+
+    def prepare(self):
+        super().prepare()
+        admission = self.admission
+        if admission is not None and self.watchdog is not None:
+            reason = admission.admit(self.endpoint_class, self.watchdog.lag)
+            if reason is not None:
+                self.log.debug("Shedding %s request: %s",
+                               type(self).__name__, reason)
+                self._reject_unavailable(
+                    "The server is overloaded", admission.retry_after
+                )
+                return
+        if self.watchdog is not None:
+            self.watchdog.enter(
+                type(self).__name__, self.request.method, self.request.path
+            )
+            self._tracked = True
+
+    def on_finish(self):
+        if self._tracked:
+            self._tracked = False
+            self.watchdog.exit()
+        if self.traffic_recorder is not None:
+            self._capture()
+        super().on_finish()
+
+    def _capture(self):
+        duration = self.request.request_time()
+        params = {}
+        for args in (self.request.query_arguments,
+                     self.request.body_arguments):
+            for k, v in args.items():
+                params[k] = v[0].decode('utf-8', 'replace')
+        authz = self.request.headers.get('Authorization', None)
+        service_prefix = self.settings.get('service_prefix', '')
+        issuer_path = urlparse(self.provider.baseurl).path
+        self.traffic_recorder.record({
+            "t": time.time() - duration,
+            "duration": duration,
+            "endpoint": type(self).__name__,
+            "issuer": issuer_path[len(service_prefix):].strip('/'),
+            "method": self.request.method,
+            "status": self.get_status(),
+            "client_id": self.request_client_id(),
+            "auth_scheme": authz.split(' ', 1)[0] if authz else None,
+            "params": params,
+            "refs": self._capture_refs(authz),
+            "issued": self._capture_issued(),
+        })
+
+    def _capture_refs(self, authz: Optional[str]) -> dict:
+        """
+        Fingerprint the codes and tokens sent with the request.
+        """
+        fingerprint = self.traffic_recorder.fingerprint
+        refs = {}
+        for name in ("code", "refresh_token", "token", "access_token"):
+            value = self.get_argument(name, None)
+            if value:
+                refs[name] = fingerprint(value)
+        if authz and authz.lower().startswith('bearer '):
+            refs["access_token"] = fingerprint(authz[7:].strip())
+        return refs
+
+    def _capture_issued(self) -> dict:
+        """
+        Fingerprint the code or tokens issued in the response.
+        """
+        response = self._captured_response
+        if response is None:
+            return {}
+        fingerprint = self.traffic_recorder.fingerprint
+        issued = {}
+        if response.status_code in (302, 303):
+            code = parse_qs(urlparse(response.message).query).get('code')
+            if code:
+                issued["code"] = fingerprint(code[0])
+        elif response.status_code == 200:
+            try:
+                body = json.loads(response.message)
+            except (TypeError, ValueError):
+                body = None
+            if isinstance(body, dict):
+                for name in ("access_token", "refresh_token"):
+                    if body.get(name):
+                        issued[name] = fingerprint(body[name])
+        return issued
+
+    def _reject_unavailable(self, description: str, retry_after: int):
+        self.set_status(503)
+        self.set_header('Retry-After', str(retry_after))
+        self.finish({
+            "error": "temporarily_unavailable",
+            "error_description": description,
+        })
+
+    def basic_credentials(self) -> Optional[Tuple[str, str]]:
+        """
+        Get the client ID and secret from the Basic authorization header.
+
+        :return: (client_id, secret), or None if the request has no valid
+            Basic authorization header.
+        """
+        authz = self.request.headers.get('Authorization', '')
+        if not authz.lower().startswith('basic '):
+            return None
+        try:
+            decoded = base64.b64decode(authz[6:].strip()).decode('utf-8')
+        except (binascii.Error, UnicodeDecodeError):
+            return None
+        client_id, _, secret = decoded.partition(':')
+        return unquote(client_id), unquote(secret)
+
+    def request_client_id(self) -> Optional[str]:
+        """
+        Get the client ID of the request from the Basic authorization header
+        or from the request parameters. The secret is never returned.
+        """
+        credentials = self.basic_credentials()
+        if credentials is not None:
+            return credentials[0]
+        return self.get_argument('client_id', None)
 
     def finish_response(self, response: Response):
+        if self.traffic_recorder is not None:
+            self._captured_response = response
         if response.status_code == 302 or response.status_code == 303:
             self.redirect(response.message, status=response.status_code)
             return
@@ -23,3 +177,10 @@ class BaseOIDHandler(web.RequestHandler):
         for k, v in response.headers:
             self.set_header(k, v)
         self.finish(response.message)
+
+
+class BaseAdminHandler(HubOAuthenticated, BaseOIDHandler):
+    def check_admin(self):
+        user = self.get_current_user()
+        if not user or not user.get('admin', False):
+            raise web.HTTPError(403, "Admin access required")
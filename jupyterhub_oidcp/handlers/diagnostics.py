@@ -0,0 +1,63 @@
+from tornado import web
+
+from .base import BaseAdminHandler
+
+
+def _limit_argument(handler: web.RequestHandler, default: int = 20) -> int:
+    try:
+        limit = int(handler.get_query_argument('limit', str(default)))
+    except ValueError:
+        raise web.HTTPError(400, "limit must be an integer")
+    if limit < 1:
+        raise web.HTTPError(400, "limit must be at least 1")
+    return limit
+
+
+class MemoryDiagnosticsHandler(BaseAdminHandler):
+    @property
+    def memory_diagnostics(self):
+        return self.settings['memory_diagnostics']
+
+    @web.authenticated
+    async def get(self):
+        self.check_admin()
+        limit = _limit_argument(self)
+        key_type = self.get_query_argument('key_type', 'lineno')
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            raise web.HTTPError(400, f"Invalid key_type: {key_type}")
+        structures = self.memory_diagnostics.structures()
+        try:
+            top_allocations = await self.memory_diagnostics.top_allocations(
+                limit=limit, key_type=key_type
+            )
+        except RuntimeError as e:
+            raise web.HTTPError(409, str(e))
+        self.set_status(200)
+        self.finish({
+            "structures": structures,
+            "tracemalloc": top_allocations,
+        })
+
+    @web.authenticated
+    async def post(self):
+        self.check_admin()
+        try:
+            await self.memory_diagnostics.take_snapshot()
+        except RuntimeError as e:
+            raise web.HTTPError(409, str(e))
+        self.set_status(200)
+        self.finish({"snapshot": True})
+
+
+class LoopDiagnosticsHandler(BaseAdminHandler):
+    @web.authenticated
+    def get(self):
+        self.check_admin()
+        watchdog = self.watchdog
+        limit = _limit_argument(self)
+        self.set_status(200)
+        self.finish({
+            "lag": watchdog.lag,
+            "stall_threshold": watchdog.threshold,
+            "stalls": watchdog.recent_stalls(limit),
+        })
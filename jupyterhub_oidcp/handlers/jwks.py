@@ -4,6 +4,8 @@ from .base import BaseOIDHandler
 
 
 class JwksHandler(BaseOIDHandler):
+    endpoint_class = "cheap"
+
     def get(self):
         keybundle = self.provider.keybundle
         resp = json.loads(str(keybundle))
@@ -12,6 +14,6 @@ class JwksHandler(BaseOIDHandler):
             del key['d']
             if 'k' in key:
                 del key['k']
-        self.log.debug(f"JwksHandler.get: {resp}")
+        self.log.debug("JwksHandler.get: %s", resp)
         self.set_status(200)
         self.finish(resp)
@@ -0,0 +1,14 @@
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from tornado import web
+
+from .base import BaseAdminHandler
+
+
+class MetricsHandler(BaseAdminHandler):
+    endpoint_class = "cheap"
+
+    @web.authenticated
+    def get(self):
+        self.check_admin()
+        self.set_header('Content-Type', CONTENT_TYPE_LATEST)
+        self.finish(generate_latest(REGISTRY))
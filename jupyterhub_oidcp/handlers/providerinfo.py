@@ -1,30 +1,36 @@
 import json
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
 
 from .base import BaseOIDHandler
 
 
 class ProviderInfoHandler(BaseOIDHandler):
+    endpoint_class = "cheap"
+
     def get(self):
         provider_info = self.provider.providerinfo_endpoint()
-        self.log.debug(f"ProviderInfoHandler.get: {provider_info}")
+        self.log.debug("ProviderInfoHandler.get: %s", provider_info)
         self.finish_response(provider_info)
 
 
 class InternalProviderInfoHandler(BaseOIDHandler):
+    endpoint_class = "cheap"
+
     def get(self):
-        if not self.internal_base_url:
+        if not self.internal_base_url and not self.internal_unix_socket:
             self.set_status(404)
             self.finish({"error": "Internal base URL not set"})
             return
         provider_info = self.provider.providerinfo_endpoint()
-        self.log.debug(f"InternalProviderInfoHandler.get: {provider_info}")
+        self.log.debug("InternalProviderInfoHandler.get: %s", provider_info)
         if provider_info.status_code != 200:
             self.finish_response(provider_info)
             return
         response = json.loads(provider_info.message)
-        for uri in ["token_endpoint", "jwks_uri", "userinfo_endpoint"]:
-            response[uri] = self._fix_uri(response[uri])
+        for uri in ["token_endpoint", "jwks_uri", "userinfo_endpoint",
+                    "revocation_endpoint"]:
+            if uri in response:
+                response[uri] = self._fix_uri(response[uri])
         self.set_status(200)
         self.finish(response)
 
@@ -32,9 +38,18 @@ class InternalProviderInfoHandler(BaseOIDHandler):
     def internal_base_url(self):
         return self.settings.get("internal_base_url", None)
 
+    @property
+    def internal_unix_socket(self):
+        return self.settings.get("internal_unix_socket", None)
+
     def _fix_uri(self, uri):
-        internal = urlparse(self.internal_base_url)
         parsed = urlparse(uri)
+        if self.internal_unix_socket:
+            return parsed._replace(
+                scheme="http+unix",
+                netloc=quote(self.internal_unix_socket, safe=""),
+            ).geturl()
+        internal = urlparse(self.internal_base_url)
         return parsed._replace(
             scheme=internal.scheme,
             netloc=internal.netloc,
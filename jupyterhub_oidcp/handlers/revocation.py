@@ -0,0 +1,82 @@
+import hmac
+from typing import Optional
+
+from .base import BaseOIDHandler
+from ..audit import audit_event
+from ..revocation import find_session, revoke_session
+
+
+class RevocationHandler(BaseOIDHandler):
+    """
+    The token revocation endpoint (RFC 7009).
+    """
+
+    def post(self):
+        client_id = self._authenticate_client()
+        if client_id is None:
+            audit_event(
+                "client_auth_failure",
+                reason="invalid_client",
+                client_id=self.request_client_id(),
+                remote_ip=self.request.remote_ip,
+            )
+            self.set_status(401)
+            self.set_header('WWW-Authenticate', 'Basic')
+            self.finish({"error": "invalid_client"})
+            return
+        token = self.get_body_argument('token', None)
+        if not token:
+            self.set_status(400)
+            self.finish({
+                "error": "invalid_request",
+                "error_description": "Missing token",
+            })
+            return
+        session = find_session(self.provider, token)
+        if session is None:
+            # Unknown and already expired tokens are not an error
+            self.set_status(200)
+            self.finish()
+            return
+        if session.get('client_id') != client_id:
+            self.set_status(400)
+            self.finish({
+                "error": "unauthorized_client",
+                "error_description": "The token was issued to another "
+                                     "client",
+            })
+            return
+        revoke_session(self.provider, self.revocation_index, session)
+        audit_event(
+            "token_revoked",
+            client_id=client_id,
+            token_type_hint=self.get_body_argument('token_type_hint', None),
+            remote_ip=self.request.remote_ip,
+        )
+        self.set_status(200)
+        self.finish()
+
+    def _authenticate_client(self) -> Optional[str]:
+        """
+        Authenticate the client with client_secret_basic or
+        client_secret_post.
+
+        :return: The client ID, or None if authentication failed.
+        """
+        credentials = self.basic_credentials()
+        if credentials is not None:
+            client_id, client_secret = credentials
+        else:
+            client_id = self.get_body_argument('client_id', None)
+            client_secret = self.get_body_argument('client_secret', None)
+        if not client_id or not client_secret:
+            return None
+        try:
+            expected = self.provider.cdb[client_id]['client_secret']
+        except KeyError:
+            return None
+        if not expected or not hmac.compare_digest(
+            client_secret.encode('utf-8'), expected.encode('utf-8')
+        ):
+            return None
+        return client_id
@@ -1,11 +1,77 @@
+import json
+
+from oic.exception import FailedAuthentication
+from oic.oauth2.message import TokenErrorResponse
+from oic.utils.authn.client import AuthnFailure
+from oic.utils.http_util import Unauthorized
+
 from .base import BaseOIDHandler
+from ..audit import audit_event
 
 
 class TokenHandler(BaseOIDHandler):
+    endpoint_class = "expensive"
+
     def post(self):
-        resp = self.provider.token_endpoint(
-            request=self.request.body.decode('utf-8'),
-            authn=self.request.headers.get('Authorization', None)
-        )
-        self.log.debug(f"TokenHandler.post: {resp.message}")
+        request = self.request.body.decode('utf-8')
+        authn = self.request.headers.get('Authorization', None)
+        resp = self._authenticate_client(request, authn)
+        if resp is None:
+            resp = self.provider.token_endpoint(request=request, authn=authn)
+            self._audit(resp)
+        self.log.debug("TokenHandler.post: %s", resp.message)
         self.finish_response(resp)
+
+    def _authenticate_client(self, request, authn):
+        """
+        Authenticate the client before oic handles the request.
+
+        oic answers client authentication failures with the same 401
+        unauthorized_client as grant errors, so they are told apart and
+        audited here. Returns the error response, or None.
+        """
+        areq = self.provider.server.message_factory.get_request_type(
+            "token_endpoint"
+        )().deserialize(request, "urlencoded")
+        try:
+            self.provider.client_authn(self.provider, areq, authn)
+        except (FailedAuthentication, AuthnFailure) as e:
+            audit_event(
+                "client_auth_failure",
+                reason=str(e),
+                redirect_uri=areq.get('redirect_uri'),
+                client_id=self.request_client_id(),
+                remote_ip=self.request.remote_ip,
+            )
+            error = TokenErrorResponse(
+                error="unauthorized_client", error_description=str(e)
+            )
+            return Unauthorized(error.to_json(), content="application/json")
+        return None
+
+    def _audit(self, resp):
+        client_id = self.request_client_id()
+        if resp.status_code == 200:
+            audit_event(
+                "token_issued",
+                client_id=client_id,
+                remote_ip=self.request.remote_ip,
+            )
+            return
+        try:
+            body = json.loads(resp.message)
+            error = body.get('error')
+            description = body.get('error_description')
+        except (ValueError, AttributeError):
+            error = description = None
+        # oic answers most grant errors (unknown, expired or replayed
+        # codes, redirect_uri and state mismatches) with 401
+        # unauthorized_client
+        audit_event(
+            "token_request_rejected",
+            reason=error,
+            description=description,
+            status=resp.status_code,
+            client_id=client_id,
+            remote_ip=self.request.remote_ip,
+        )
@@ -3,9 +3,29 @@ from .base import BaseOIDHandler
 
 class UserInfoHandler(BaseOIDHandler):
     def get(self):
+        if self._is_revoked():
+            self.set_status(401)
+            self.set_header('WWW-Authenticate',
+                            'Bearer error="invalid_token"')
+            self.finish({
+                "error": "invalid_token",
+                "error_description": "Token has been revoked",
+            })
+            return
         resp = self.provider.userinfo_endpoint(
             request=self.request.uri,
             authn=self.request.headers.get('Authorization', None)
         )
-        self.log.debug(f"UserInfoHandler.post: {resp.message}")
+        self.log.debug("UserInfoHandler.get: %s", resp.message)
         self.finish_response(resp)
+
+    def _is_revoked(self) -> bool:
+        index = self.revocation_index
+        if index is None:
+            return False
+        authz = self.request.headers.get('Authorization', '')
+        if authz.lower().startswith('bearer '):
+            token = authz[7:].strip()
+        else:
+            token = self.get_query_argument('access_token', None)
+        return bool(token) and index.is_revoked(token)
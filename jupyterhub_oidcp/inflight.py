@@ -0,0 +1,106 @@
+import asyncio
+import time
+import weakref
+
+from tornado import httputil
+
+from .metrics import INFLIGHT_REQUESTS
+
+
+class InflightTracker(httputil.HTTPServerConnectionDelegate):
+    """
+    Track the connections of an application that are in the middle of a
+    request.
+
+    A connection is busy from the moment the headers of a request arrive
+    until its response has been written, including while the body is
+    still being received, and idle while it waits for the next request.
+    Pass the tracker to `HTTPServer` in place of the application.
+    """
+
+    def __init__(self, application: httputil.HTTPServerConnectionDelegate):
+        """
+        Initialize the tracker.
+
+        :param application: The application serving the requests.
+        """
+        self.application = application
+        # HTTPServer does not tell its delegate when a connection closes,
+        # so closed connections are dropped when they are collected
+        self._busy = weakref.WeakKeyDictionary()
+        INFLIGHT_REQUESTS.set_function(lambda: self.total)
+
+    @property
+    def total(self) -> int:
+        """
+        The number of requests being received or handled.
+        """
+        return sum(
+            1 for conn, busy in list(self._busy.items())
+            if busy and not conn.stream.closed()
+        )
+
+    def start_request(self, server_conn, request_conn):
+        # A connection starts reading its next request only once the
+        # previous response has been written
+        self._busy[server_conn] = False
+        return _TrackedDelegate(
+            self,
+            server_conn,
+            self.application.start_request(server_conn, request_conn),
+        )
+
+    def close_idle_connections(self) -> int:
+        """
+        Close the connections that are waiting for a request.
+
+        :return: The number of connections closed.
+        """
+        closed = 0
+        for conn, busy in list(self._busy.items()):
+            if not busy and not conn.stream.closed():
+                conn.stream.close()
+                closed += 1
+        return closed
+
+    async def drain(self, timeout: float, interval: float = 0.05) -> bool:
+        """
+        Close idle connections until no request is in flight.
+
+        Busy connections are closed as soon as their response has been
+        written. The server should already have stopped accepting
+        connections and keep-alive should be disabled.
+
+        :param timeout: The maximum number of seconds to wait.
+        :param interval: The polling interval in seconds.
+        :return: True if all requests finished before the deadline.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self.close_idle_connections()
+            if self.total == 0:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+
+
+class _TrackedDelegate(httputil.HTTPMessageDelegate):
+    def __init__(self, tracker, server_conn, delegate):
+        self.tracker = tracker
+        self.server_conn = server_conn
+        self.delegate = delegate
+
+    def headers_received(self, start_line, headers):
+        self.tracker._busy[self.server_conn] = True
+        return self.delegate.headers_received(start_line, headers)
+
+    def data_received(self, chunk):
+        return self.delegate.data_received(chunk)
+
+    def finish(self):
+        self.delegate.finish()
+
+    def on_connection_close(self):
+        self.tracker._busy[self.server_conn] = False
+        self.delegate.on_connection_close()
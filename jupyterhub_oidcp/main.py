@@ -2,12 +2,17 @@ import asyncio
 import json
 import logging
 import os
+import signal
+import time
+from typing import Optional
 from urllib.parse import urljoin
 
 from tornado import web
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_unix_socket
 from jupyterhub.traitlets import URLPrefix
 from jupyterhub.services.auth import HubOAuthCallbackHandler
-from traitlets import Unicode, Int, default
+from traitlets import Unicode, Int, Float, Bool, List, default
 from traitlets.config.application import Application, catch_config_error
 from .handlers import (
     ProviderInfoHandler,
@@ -16,13 +21,38 @@ from .handlers import (
     TokenHandler,
     JwksHandler,
     UserInfoHandler,
+    MetricsHandler,
+    MemoryDiagnosticsHandler,
+    LoopDiagnosticsHandler,
+    RevocationHandler,
 )
+from .admission import AdmissionController
+from .audit import configure_logging
+from .capture import TrafficRecorder
+from .diagnostics import MemoryDiagnostics
 from .emailpattern import EmailPattern
+from .inflight import InflightTracker
+from .metrics import RELOADS, RELOAD_DURATION_SECONDS
 from .provider import HubOAuthProvider
-from .userstore import MemoryUserStore
+from .revocation import RevocationIndex, revoke_user
+from .userstore import MemoryUserStore, HubUserSync
+from .watchdog import LoopWatchdog
 
 
 logger = logging.getLogger(__name__)
+RESERVED_ISSUER_PREFIXES = ("internal", "metrics", "diagnostics")
+EMAIL_PATTERN_KEYS = (
+    "email_pattern", "admin_email_pattern", "user_email_pattern",
+)
+
+
+class FileMode(Int):
+    """
+    A file mode, given in octal on the command line.
+    """
+
+    def from_string(self, s):
+        return int(s, 8)
 
 
 class OpenIDConnectProviderApp(Application):
@@ -49,6 +79,24 @@ class OpenIDConnectProviderApp(Application):
 
     port = Int(8888, help="The port to listen on.").tag(config=True)
 
+    unix_socket = Unicode(
+        help="""The path of a Unix domain socket to listen on in addition
+        to the port. Co-located clients can use it to reach the token,
+        userinfo and JWKS endpoints without going through TCP.""",
+    ).tag(config=True)
+
+    unix_socket_mode = FileMode(
+        0o600,
+        help="""The permission bits of the Unix domain socket, in octal on
+        the command line. Use 660 or 666 when clients run as another user.""",
+    ).tag(config=True)
+
+    advertise_unix_socket = Bool(
+        False,
+        help="""Advertise the Unix domain socket as http+unix:// URLs
+        in the internal discovery document.""",
+    ).tag(config=True)
+
     services = Unicode(
         "[]",
         help="The services to provide OpenID Connect for."
@@ -58,6 +106,15 @@ class OpenIDConnectProviderApp(Application):
         help="The path to the vault.",
     ).tag(config=True)
 
+    issuers = Unicode(
+        "[]",
+        help="""Additional issuers to serve from this process, as a JSON
+        list. Each issuer is a dictionary with the keys 'prefix' and
+        'services', and optionally 'issuer', 'vault_path', 'email_pattern',
+        'admin_email_pattern' and 'user_email_pattern'. The endpoints of
+        an issuer are served under '<service_prefix>/<prefix>/'.""",
+    ).tag(config=True)
+
     email_pattern = Unicode(
         help="""The format of the email address to use for the user.
         The email address will be formatted using this pattern. For example,
@@ -73,18 +130,128 @@ class OpenIDConnectProviderApp(Application):
         help="The format of the email address to use for the non-admin user."
     ).tag(config=True)
 
+    log_sample_rate = Float(
+        1.0,
+        help="""The fraction of high-volume (below WARNING) log records to
+        keep. Audit records are always kept.""",
+    ).tag(config=True)
+
+    log_file = Unicode(
+        help="The file to write JSON logs to. Defaults to stderr."
+    ).tag(config=True)
+
+    config_file = Unicode(
+        help="""The configuration file to load. It is read again when
+        the process receives SIGHUP.""",
+    ).tag(config=True)
+
+    shutdown_timeout = Float(
+        30.0,
+        help="""The maximum number of seconds to wait for in-flight
+        requests to finish on shutdown.""",
+    ).tag(config=True)
+
+    max_queue_delay = Float(
+        0.0,
+        help="""The smoothed event loop lag in seconds above which requests
+        to the endpoint classes in shed_endpoint_classes are rejected with
+        503. The lag includes the time requests wait in the socket backlog
+        while the loop is busy. 0 disables the limit.""",
+    ).tag(config=True)
+
+    shed_endpoint_classes = List(
+        Unicode(),
+        ["expensive"],
+        help="""The endpoint classes whose requests may be rejected under
+        load. The token and authorization endpoints are 'expensive', the
+        discovery and JWKS endpoints are 'cheap' and the userinfo endpoint
+        is 'default'.""",
+    ).tag(config=True)
+
+    shed_retry_after = Int(
+        1,
+        help="The Retry-After value in seconds for rejected requests.",
+    ).tag(config=True)
+
+    stall_threshold = Float(
+        0.5,
+        help="""The number of seconds the event loop may be blocked before
+        the stack of the blocking call is logged. 0 disables stall
+        detection; the lag is still measured for admission control.""",
+    ).tag(config=True)
+
+    watchdog_interval = Float(
+        0.1,
+        help="The number of seconds between two event loop lag samples.",
+    ).tag(config=True)
+
+    capture_path = Unicode(
+        help="""The file to append a sanitized trace of the handled requests
+        to, for replay with `python -m jupyterhub_oidcp.replay`. Capture is
+        disabled if not set.""",
+    ).tag(config=True)
+
+    tracemalloc_frames = Int(
+        0,
+        help="""The number of frames tracemalloc stores per allocation for
+        the memory diagnostics endpoint. Tracing slows down allocations
+        and stores a trace per live object.
+        0 disables tracemalloc; the sizes of the provider's own structures
+        are still reported.""",
+    ).tag(config=True)
+
+    revocation_index_path = Unicode(
+        help="""The file to persist revoked tokens to. Workers sharing the
+        file reject each other's revoked tokens. Revocations are kept in
+        memory only if not set.""",
+    ).tag(config=True)
+
+    revocation_max_entries = Int(
+        100000,
+        help="""The number of revoked tokens above which expired entries
+        are dropped from the revocation index.""",
+    ).tag(config=True)
+
+    user_sync_interval = Float(
+        0.0,
+        help="""The number of seconds between two lookups of the known users
+        in the JupyterHub API. The tokens of users removed from JupyterHub
+        are revoked. The service needs the read:users scope. 0 disables
+        the sync.""",
+    ).tag(config=True)
+
     aliases = {
+        "config": "OpenIDConnectProviderApp.config_file",
         "issuer": "OpenIDConnectProviderApp.issuer",
         "base-url": "OpenIDConnectProviderApp.base_url",
         "internal-base-url": "OpenIDConnectProviderApp.internal_base_url",
         "port": "OpenIDConnectProviderApp.port",
+        "unix-socket": "OpenIDConnectProviderApp.unix_socket",
+        "unix-socket-mode": "OpenIDConnectProviderApp.unix_socket_mode",
         "services": "OpenIDConnectProviderApp.services",
         "vault-path": "OpenIDConnectProviderApp.vault_path",
+        "issuers": "OpenIDConnectProviderApp.issuers",
         "email-pattern": "OpenIDConnectProviderApp.email_pattern",
         "admin-email-pattern": "OpenIDConnectProviderApp.admin_email_pattern",
         "user-email-pattern": "OpenIDConnectProviderApp.user_email_pattern",
+        "log-sample-rate": "OpenIDConnectProviderApp.log_sample_rate",
+        "log-file": "OpenIDConnectProviderApp.log_file",
+        "shutdown-timeout": "OpenIDConnectProviderApp.shutdown_timeout",
+        "max-queue-delay": "OpenIDConnectProviderApp.max_queue_delay",
+        "stall-threshold": "OpenIDConnectProviderApp.stall_threshold",
+        "capture-path": "OpenIDConnectProviderApp.capture_path",
+        "tracemalloc-frames": "OpenIDConnectProviderApp.tracemalloc_frames",
+        "revocation-index-path":
+            "OpenIDConnectProviderApp.revocation_index_path",
+        "user-sync-interval": "OpenIDConnectProviderApp.user_sync_interval",
     }
 
+    flags = dict(Application.flags)
+    flags["advertise-unix-socket"] = (
+        {"OpenIDConnectProviderApp": {"advertise_unix_socket": True}},
+        "Advertise the Unix domain socket in the internal discovery document.",
+    )
+
     hub_prefix = URLPrefix('/hub/')
 
     @default("base_url")
@@ -103,27 +270,134 @@ class OpenIDConnectProviderApp(Application):
         Initialize the application.
         """
         super().initialize(argv)
+        self._load_config_file()
         self.log.info("Initializing OpenID Connect Provider App")
 
+    def _load_config_file(self):
+        if not self.config_file:
+            return
+        path = os.path.abspath(self.config_file)
+        base, _ = os.path.splitext(os.path.basename(path))
+        self.load_config_file(base, path=os.path.dirname(path))
+
     def start(self):
         """
         Start the application.
         """
         self._configure_python_logging()
         self.log.info("Starting OpenID Connect Provider App")
-        asyncio.run(self._start())
+        try:
+            asyncio.run(self._start())
+        finally:
+            self._log_listener.stop()
 
     async def _start(self):
         """
         Start the application. This is an async method.
         """
         app = self._make_app()
-        app.listen(self.port)
-        self.log.info(f"Listening on port {self.port}")
-        await asyncio.Event().wait()
+        self._inflight = InflightTracker(app)
+        self._server = HTTPServer(self._inflight)
+        self._server.listen(self.port)
+        self.log.info("Listening on port %s", self.port)
+        if self.unix_socket:
+            self._server.add_socket(
+                bind_unix_socket(self.unix_socket, mode=self.unix_socket_mode)
+            )
+            self.log.info("Listening on Unix socket %s", self.unix_socket)
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopping.set)
+        loop.add_signal_handler(signal.SIGHUP, self._reload)
+        self._watchdog.start()
+        if self._user_sync is not None:
+            self._user_sync.start()
+        await stopping.wait()
+        await self._shutdown()
+
+    async def _shutdown(self):
+        """
+        Stop accepting connections, drain in-flight requests and flush
+        the stores.
+        """
+        self.log.info("Shutting down: draining %d in-flight requests",
+                      self._inflight.total)
+        self._server.stop()
+        # Requests already on their way are served, with Connection: close
+        self._server.conn_params.no_keep_alive = True
+        drained = await self._inflight.drain(self.shutdown_timeout)
+        if not drained:
+            self.log.warning("Shutdown deadline exceeded with %d requests "
+                             "in flight", self._inflight.total)
+        try:
+            await asyncio.wait_for(self._server.close_all_connections(), 1)
+        except asyncio.TimeoutError:
+            self.log.warning("Timed out closing connections")
+        if self.unix_socket and os.path.exists(self.unix_socket):
+            os.remove(self.unix_socket)
+        if self._user_sync is not None:
+            self._user_sync.stop()
+        self._userstore.flush()
+        self._watchdog.stop()
+        if self._traffic_recorder is not None:
+            self._traffic_recorder.stop()
+        self.log.info("Shutdown complete")
+
+    def _reload(self):
+        """
+        Re-read the configuration, clients, email patterns and keys
+        without dropping the listening socket.
+        """
+        self.log.info("Reloading configuration")
+        started = time.monotonic()
+        try:
+            try:
+                self._load_config_file()
+            finally:
+                self._route_app_log(self._python_log_level())
+            definitions = self._issuer_definitions()
+            for definition in definitions:
+                provider = self._providers.get(definition["prefix"])
+                if provider is None:
+                    self.log.warning("Issuer /%s was added; restart to "
+                                     "serve it", definition["prefix"])
+                    continue
+                provider.reload(
+                    definition["services"],
+                    vault_path=definition["vault_path"],
+                    email_pattern=definition["email_pattern"],
+                )
+            removed = set(self._providers) - set(
+                definition["prefix"] for definition in definitions
+            )
+            for prefix in removed:
+                self.log.warning("Issuer /%s was removed; restart to "
+                                 "stop serving it", prefix)
+            self._web_app.settings["internal_base_url"] = \
+                self.internal_base_url
+            self._configure_admission(self._admission)
+        except Exception:
+            RELOADS.labels("failure").inc()
+            self.log.exception("Failed to reload configuration")
+            return
+        elapsed = time.monotonic() - started
+        RELOADS.labels("success").inc()
+        RELOAD_DURATION_SECONDS.observe(elapsed)
+        self.log.info("Reloaded configuration in %.1f ms", elapsed * 1000)
 
     def _configure_python_logging(self):
-        self.log.info(f"Configuring logging level: {self.log_level}")
+        self.log.info("Configuring logging level: %s", self.log_level)
+        level = self._python_log_level()
+        self._log_listener = configure_logging(
+            level,
+            sample_rate=self.log_sample_rate,
+            filename=self.log_file or None,
+        )
+        self._route_app_log(level)
+        logger.info("Logging level set to %s", level)
+
+    def _python_log_level(self) -> int:
         # (0, 10, 20, 30, 40, 50, "DEBUG", "INFO", "WARN", "ERROR", "CRITICAL")
         level = logging.INFO
         if self.log_level == 0:
@@ -138,29 +412,77 @@ class OpenIDConnectProviderApp(Application):
             level = logging.ERROR
         elif self.log_level == 50 or self.log_level == "CRITICAL":
             level = logging.CRITICAL
-        logging.basicConfig(level=level)
-        logger.info(f"Logging level set to {level}")
+        return level
+
+    def _route_app_log(self, level: int):
+        """
+        Send the application log through the logging queue.
+
+        traitlets re-attaches its console handler to the application log
+        and resets its level whenever the configuration is loaded, so this
+        runs again after every reload.
+        """
+        for handler in list(self.log.handlers):
+            self.log.removeHandler(handler)
+        self.log.propagate = True
+        self.log.setLevel(level)
+        logging.getLogger().setLevel(level)
 
     def _make_app(self):
-        self.log.info("Making OpenID Connect Provider App " +
-                      f"base_url={self.base_url}," +
-                      f"service_prefix={self.service_prefix}")
-        services = json.loads(self.services)
-        self.log.info(f"Services: {services}")
+        self.log.info("Making OpenID Connect Provider App "
+                      "base_url=%s, service_prefix=%s",
+                      self.base_url, self.service_prefix)
+        service_prefix = self.service_prefix
+        if service_prefix.endswith('/'):
+            service_prefix = service_prefix[:-1]
+        # The Hub user cache is shared by all issuers
         userstore = MemoryUserStore()
-        email_pattern = EmailPattern(
-            pattern=self.email_pattern,
-            pattern_admin=self.admin_email_pattern,
-            pattern_user=self.user_email_pattern,
+        self._userstore = userstore
+        self._providers = {}
+        self._revocation_index = RevocationIndex(
+            self.revocation_index_path or None,
+            max_entries=self.revocation_max_entries,
         )
-        provider = HubOAuthProvider(
-            self.issuer,
-            services,
-            urljoin(self.base_url, self.service_prefix),
-            userstore,
-            vault_path=self.vault_path,
-            email_pattern=email_pattern,
+        userstore.add_removal_listener(self._revoke_user)
+        self._user_sync = None
+        if self.user_sync_interval > 0:
+            self._user_sync = HubUserSync(
+                userstore,
+                os.environ['JUPYTERHUB_API_URL'],
+                os.environ['JUPYTERHUB_API_TOKEN'],
+                self.user_sync_interval,
+            )
+        self._admission = AdmissionController()
+        self._configure_admission(self._admission)
+        self._watchdog = LoopWatchdog(
+            threshold=self.stall_threshold,
+            interval=self.watchdog_interval,
         )
+        self._traffic_recorder = None
+        if self.capture_path:
+            self._traffic_recorder = TrafficRecorder(self.capture_path)
+            self._traffic_recorder.start()
+        handlers = []
+        for definition in self._issuer_definitions():
+            prefix = definition["prefix"]
+            path = f'{service_prefix}/{prefix}' if prefix else service_prefix
+            services = definition["services"]
+            self.log.info("Issuer /%s services: %s", prefix,
+                          [service.get('oauth_client_id')
+                           for service in services])
+            provider = HubOAuthProvider(
+                definition["issuer"],
+                services,
+                urljoin(self.base_url, f'{path}/'),
+                userstore,
+                vault_path=definition["vault_path"],
+                email_pattern=definition["email_pattern"],
+            )
+            self._providers[prefix] = provider
+            handlers.extend(self._issuer_handlers(path, dict(
+                provider=provider,
+                userstore=userstore,
+            )))
         oauth_callback_url = os.environ.get(
             'JUPYTERHUB_OAUTH_CALLBACK_URL',
             urljoin(self.service_prefix, 'oauth_callback'))
@@ -169,35 +491,114 @@ class OpenIDConnectProviderApp(Application):
             log=self.log,
             base_url=self.base_url,
             internal_base_url=self.internal_base_url,
+            internal_unix_socket=(
+                self.unix_socket if self.advertise_unix_socket else None
+            ),
             service_prefix=self.service_prefix,
             hub_prefix=self.hub_prefix,
             cookie_secret=os.urandom(32),
+            admission=self._admission,
+            watchdog=self._watchdog,
+            traffic_recorder=self._traffic_recorder,
+            revocation_index=self._revocation_index,
+            memory_diagnostics=MemoryDiagnostics(
+                self._providers,
+                userstore,
+                frames=self.tracemalloc_frames,
+            ),
         )
         handler_settings = dict(
-            provider=provider,
+            provider=self._providers[""],
             userstore=userstore,
         )
-        service_prefix = self.service_prefix
-        if service_prefix.endswith('/'):
-            service_prefix = service_prefix[:-1]
-        return web.Application([
+        self._web_app = web.Application([
             (oauth_callback_url, HubOAuthCallbackHandler),
+            (f'{service_prefix}/metrics', MetricsHandler, handler_settings),
+            (
+                f'{service_prefix}/diagnostics/memory',
+                MemoryDiagnosticsHandler,
+                handler_settings,
+            ),
             (
-                f'{service_prefix}/.well-known/openid-configuration',
+                f'{service_prefix}/diagnostics/loop',
+                LoopDiagnosticsHandler,
+                handler_settings,
+            ),
+        ] + handlers, **tornado_settings)
+        return self._web_app
+
+    def _revoke_user(self, uid: str):
+        for provider in self._providers.values():
+            revoke_user(provider, self._revocation_index, uid)
+
+    def _configure_admission(self, admission: AdmissionController):
+        admission.max_queue_delay = self.max_queue_delay
+        admission.shed_endpoint_classes = set(self.shed_endpoint_classes)
+        admission.retry_after = self.shed_retry_after
+
+    def _issuer_handlers(self, path, handler_settings):
+        return [
+            (
+                f'{path}/.well-known/openid-configuration',
                 ProviderInfoHandler,
                 handler_settings,
             ),
-            (f'{service_prefix}/internal/.well-known/openid-configuration',
+            (f'{path}/internal/.well-known/openid-configuration',
              InternalProviderInfoHandler, handler_settings),
             (
-                f'{service_prefix}/authorization',
+                f'{path}/authorization',
                 AuthorizationHandler,
                 handler_settings,
             ),
-            (f'{service_prefix}/token', TokenHandler, handler_settings),
-            (f'{service_prefix}/userinfo', UserInfoHandler, handler_settings),
-            (f'{service_prefix}/jwks.json', JwksHandler, handler_settings),
-        ], **tornado_settings)
+            (f'{path}/token', TokenHandler, handler_settings),
+            (f'{path}/revocation', RevocationHandler, handler_settings),
+            (f'{path}/userinfo', UserInfoHandler, handler_settings),
+            (f'{path}/jwks.json', JwksHandler, handler_settings),
+        ]
+
+    def _issuer_definitions(self):
+        """
+        Get the issuers to serve. The first one is the default issuer
+        served directly under the service prefix.
+        """
+        definitions = [dict(
+            prefix="",
+            issuer=self.issuer,
+            services=json.loads(self.services),
+            vault_path=self.vault_path,
+            email_pattern=self._make_email_pattern(),
+        )]
+        for issuer in json.loads(self.issuers):
+            prefix = issuer.get("prefix", "").strip("/")
+            if not prefix:
+                raise ValueError("Issuer must have a 'prefix' key.")
+            if prefix in RESERVED_ISSUER_PREFIXES:
+                raise ValueError(f"Issuer prefix is reserved: {prefix}")
+            if prefix in [d["prefix"] for d in definitions]:
+                raise ValueError(f"Duplicate issuer prefix: {prefix}")
+            if "services" not in issuer:
+                raise ValueError("Issuer must have a 'services' key.")
+            definitions.append(dict(
+                prefix=prefix,
+                issuer=issuer.get("issuer", f"{self.issuer}/{prefix}"),
+                services=issuer["services"],
+                vault_path=issuer.get("vault_path", ""),
+                email_pattern=self._make_email_pattern(issuer),
+            ))
+        return definitions
+
+    def _make_email_pattern(self, issuer: Optional[dict] = None):
+        if issuer and any(key in issuer for key in EMAIL_PATTERN_KEYS):
+            return EmailPattern(
+                pattern=issuer.get("email_pattern"),
+                pattern_admin=issuer.get("admin_email_pattern"),
+                pattern_user=issuer.get("user_email_pattern"),
+            )
+        return EmailPattern(
+            pattern=self.email_pattern,
+            pattern_admin=self.admin_email_pattern,
+            pattern_user=self.user_email_pattern,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,41 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+
+INFLIGHT_REQUESTS = Gauge(
+    "oidcp_inflight_requests",
+    "Number of requests currently being received or handled",
+)
+
+RELOADS = Counter(
+    "oidcp_reloads",
+    "Number of configuration reloads",
+    ["status"],
+)
+
+RELOAD_DURATION_SECONDS = Histogram(
+    "oidcp_reload_duration_seconds",
+    "Time taken to reload the configuration",
+)
+
+SHED_REQUESTS = Counter(
+    "oidcp_shed_requests",
+    "Number of requests rejected by admission control",
+    ["endpoint_class", "reason"],
+)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "oidcp_event_loop_lag_seconds",
+    "Delay of the event loop in running a scheduled callback",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+EVENT_LOOP_STALLS = Counter(
+    "oidcp_event_loop_stalls",
+    "Number of times the event loop was blocked longer than the threshold",
+    ["handler"],
+)
+
+DROPPED_LOG_RECORDS = Counter(
+    "oidcp_dropped_log_records",
+    "Number of log records dropped because the log queue was full",
+)
@@ -6,6 +6,7 @@ from typing import List, Optional
 from urllib.parse import urljoin
 
 from oic import rndstr
+from oic.exception import FailedAuthentication
 from oic.oic.provider import Provider
 from oic.utils.authn.authn_context import AuthnBroker
 from oic.utils.authn.user import UserAuthnMethod
@@ -86,10 +87,9 @@ class ServicesClientDatabase(BaseClientDatabase):
         """
         Get an item from the client database.
         """
-        logger.info(f"Getting item from client database: {key}")
+        logger.debug("Getting item from client database: %s", key)
         for service in self.services:
             if service['oauth_client_id'] == key:
-                logger.info(f"Found item in client database: {key}")
                 return service
         raise KeyError(key)
 
@@ -103,14 +103,14 @@ class ServicesClientDatabase(BaseClientDatabase):
         """
         Get the keys of the client database.
         """
-        logger.info("Getting keys from client database")
+        logger.debug("Getting keys from client database")
         return [service['oauth_client_id'] for service in self.services]
 
     def items(self):
         """
         Get the items of the client database.
         """
-        logger.info("Getting items from client database")
+        logger.debug("Getting items from client database")
         return [
             (service['oauth_client_id'], service)
             for service in self.services
@@ -128,9 +128,9 @@ class HubOAuthAuthnMethod(UserAuthnMethod):
         """
         Store the current user information in a cookie.
         """
-        logger.info(f"Storing current user in cookie: {user}")
         if user is None:
             raise ValueError("User must not be None.")
+        logger.debug("Storing current user in cookie: %s", user.get("name"))
         if "name" not in user:
             raise ValueError("User must have a 'name' key.")
         u = {
@@ -145,7 +145,6 @@ class HubOAuthAuthnMethod(UserAuthnMethod):
         """
         Retrieve the current user information from a cookie.
         """
-        logger.info(f"Retrieving current user from cookie: {cookie}")
         if cookie is None:
             raise ValueError("Cookie must not be None.")
         if not cookie.startswith(COOKIE_PREFIX):
@@ -166,9 +165,8 @@ class HubOAuthAuthnMethod(UserAuthnMethod):
         HubOAuthProvider passes the user information
         as the jupyterhub_currentuser.
         """
-        logger.info("Authenticating as user: " +
-                    f"{cookie}, {authorization}, {kwargs}")
         user = HubOAuthAuthnMethod.cookie_to_current_user(cookie)
+        logger.debug("Authenticated as user: %s", user.get("uid"))
         ts = int(time.time())
         return user, ts
 
@@ -181,19 +179,21 @@ def _get_authn_broker():
 
 
 def _authz(user, client_id: Optional[str] = None):
-    logger.info(f"Authorizing user: {user}, {client_id}")
+    logger.debug("Authorizing user: %s, %s", user, client_id)
     return ""
 
 
 def _client_authn(provider, areq, authn):
-    logger.info(f"Client authentication: {provider}, {areq}, {authn}")
-    redirect_uri = areq['redirect_uri']
+    redirect_uri = areq.get('redirect_uri')
     for client_id, params in provider.cdb.items():
         if redirect_uri not in [uri for uri, _ in params['redirect_uris']]:
             continue
-        logger.info(f"Found client for redirect URI: {redirect_uri}")
+        logger.debug("Found client for redirect URI: %s", redirect_uri)
         return client_id
-    raise ValueError(f"Client not found for redirect URI: {redirect_uri}")
+    # Audited by TokenHandler
+    raise FailedAuthentication(
+        f"Client not found for redirect URI: {redirect_uri}"
+    )
 
 
 def _userinfo_factory(
@@ -201,8 +201,8 @@ def _userinfo_factory(
     email_pattern: Optional[EmailPattern] = None,
 ):
     def _userinfo(uid, client_uid, userinfo_claims):
-        logger.info(f"Getting userinfo: {uid}, " +
-                    f"{client_uid}, {userinfo_claims}")
+        logger.debug("Getting userinfo: %s, %s, %s",
+                     uid, client_uid, userinfo_claims)
         userinfo = {
             "sub": uid,
             "name": uid,
@@ -252,19 +252,54 @@ class HubOAuthProvider(Provider):
             _client_authn,
             baseurl=baseurl
         )
+        self.userstore = userstore
+        self.keybundle = None
         self._init_keys(vault_path)
 
+    def reload(
+        self,
+        services: List[dict],
+        vault_path: Optional[str] = None,
+        email_pattern: Optional[EmailPattern] = None,
+    ):
+        """
+        Replace the clients, email patterns and keys in place.
+
+        Issued codes and tokens stay valid because the session database
+        is kept.
+        """
+        cdb = ServicesClientDatabase(services)
+        userinfo = _userinfo_factory(self.userstore, email_pattern)
+        self._init_keys(vault_path or self.vault_path)
+        self.cdb = cdb
+        self.userinfo = userinfo
+        logger.info("Reloaded provider: %s", self.baseurl)
+
+    def create_providerinfo(self, setup=None):
+        provider_info = super().create_providerinfo(setup)
+        provider_info["revocation_endpoint"] = urljoin(
+            self.baseurl, "revocation"
+        )
+        return provider_info
+
     def _init_keys(self, vault_path: Optional[str] = None):
         if vault_path is None or vault_path == "":
             vault_path = tempfile.mkdtemp()
+        old_keybundle = self.keybundle
         self.keybundle = key_setup(
             vault_path,
             sig={"format": "jwk", "alg": "rsa"},
         )
         keyjar = self.keyjar
         try:
-            keyjar[""].append(self.keybundle)
+            keybundles = keyjar[""]
         except KeyError:
-            keyjar[""] = self.keybundle
-        logger.info(f"Initialized keys: {vault_path}")
+            keybundles = []
+        if not isinstance(keybundles, list):
+            keybundles = [keybundles]
+        keyjar[""] = [
+            kb for kb in keybundles if kb is not old_keybundle
+        ] + [self.keybundle]
+        self.vault_path = vault_path
+        logger.info("Initialized keys: %s", vault_path)
         self.jwks_uri = urljoin(self.baseurl, "jwks.json")
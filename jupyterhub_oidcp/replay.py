@@ -0,0 +1,477 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import create_signed_value
+from traitlets import Unicode, Int, Float
+from traitlets.config.application import Application
+
+from .audit import REDACTED
+from .main import OpenIDConnectProviderApp
+
+
+SERVICE_PREFIX = "/services/oidcp/"
+CLIENT_SECRET = "replay-secret"
+USER_TOKEN_PREFIX = "replay-user-"
+ACCESS_SCOPES = ["access:services"]
+ENDPOINT_PATHS = {
+    "ProviderInfoHandler": ".well-known/openid-configuration",
+    "InternalProviderInfoHandler": "internal/.well-known/openid-configuration",
+    "AuthorizationHandler": "authorization",
+    "TokenHandler": "token",
+    "RevocationHandler": "revocation",
+    "UserInfoHandler": "userinfo",
+    "JwksHandler": "jwks.json",
+}
+
+
+def load_trace(path: str) -> List[dict]:
+    """
+    Load a trace written by TrafficRecorder, ordered by arrival time.
+    """
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """
+    Get the p-th percentile of the values using the nearest rank.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    index = int(round(p / 100 * (len(values) - 1)))
+    return values[min(len(values) - 1, index)]
+
+
+class StandInHubHandler(BaseHTTPRequestHandler):
+    """
+    Answer the Hub API calls made by HubOAuth with a fake user model.
+
+    The token "replay-user-<name>" identifies the user <name>.
+    """
+
+    def do_GET(self):
+        if not urlparse(self.path).path.rstrip("/").endswith("/api/user"):
+            self._send(404, {"message": "Not found"})
+            return
+        token = self.headers.get("Authorization", "").split(" ", 1)[-1]
+        if not token.startswith(USER_TOKEN_PREFIX):
+            self._send(403, {"message": "Invalid token"})
+            return
+        self._send(200, {
+            "kind": "user",
+            "name": token[len(USER_TOKEN_PREFIX):],
+            "admin": False,
+            "groups": [],
+            "scopes": ACCESS_SCOPES,
+            "session_id": "",
+        })
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayApp(Application):
+    """
+    Replay a captured trace against a local provider and a stand-in Hub,
+    and compare the latencies with the original ones.
+    """
+
+    trace = Unicode(
+        help="The trace file written with --capture-path."
+    ).tag(config=True)
+
+    speed = Float(
+        1.0,
+        help="The replay speed factor. 2 replays twice as fast.",
+    ).tag(config=True)
+
+    users = Int(
+        10,
+        help="The number of distinct users to log in as.",
+    ).tag(config=True)
+
+    max_clients = Int(
+        100,
+        help="The maximum number of concurrent requests.",
+    ).tag(config=True)
+
+    aliases = {
+        "trace": "ReplayApp.trace",
+        "speed": "ReplayApp.speed",
+        "users": "ReplayApp.users",
+        "max-clients": "ReplayApp.max_clients",
+    }
+
+    def start(self):
+        """
+        Start the replay.
+        """
+        trace = self.trace or (self.extra_args[0] if self.extra_args else "")
+        if not trace:
+            self.log.error("No trace file given")
+            self.exit(1)
+        records = load_trace(trace)
+        self.log.info("Replaying %d requests at %.1fx", len(records),
+                      self.speed)
+        results = asyncio.run(self._replay(records))
+        self._report(results)
+
+    async def _replay(self, records: List[dict]) -> List[dict]:
+        hub = ThreadingHTTPServer(("127.0.0.1", 0), StandInHubHandler)
+        threading.Thread(target=hub.serve_forever, daemon=True).start()
+        sockets = bind_sockets(0, "127.0.0.1")
+        port = sockets[0].getsockname()[1]
+        self._configure_environment(hub.server_address[1])
+        provider_app = self._make_provider_app(records, port)
+        loop, web_app = self._serve(provider_app, sockets)
+        try:
+            from jupyterhub.services.auth import HubOAuth
+            self._cookie_name = HubOAuth().cookie_name
+            self._cookie_secret = web_app.settings["cookie_secret"]
+            self._base_url = f"http://127.0.0.1:{port}"
+            self._server_times = {}
+            web_app.settings["log_function"] = self._server_time_recorder(
+                asyncio.get_running_loop()
+            )
+            self._user_index = 0
+            AsyncHTTPClient.configure(None, max_clients=self.max_clients)
+            self._client = AsyncHTTPClient()
+            return await self._schedule(records)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            hub.shutdown()
+
+    async def _schedule(self, records: List[dict]) -> List[dict]:
+        """
+        Send the records on their original schedule, scaled by the speed.
+
+        A request that uses a code or token waits for the request that
+        issued it, and for the requests that used the same code or token
+        and had finished before it arrived in the trace, e.g. a userinfo
+        request after a revocation.
+        """
+        loop = asyncio.get_running_loop()
+        self._issued = {
+            fingerprint
+            for record in records
+            for fingerprint in record.get("issued", {}).values()
+        }
+        self._slots = {}
+        users = defaultdict(list)
+        t0 = records[0]["t"] if records else 0
+        started = time.monotonic()
+        tasks = []
+        for record in records:
+            delay = (record["t"] - t0) / self.speed - (
+                time.monotonic() - started
+            )
+            if delay > 0:
+                await asyncio.sleep(delay)
+            for fingerprint in record.get("issued", {}).values():
+                self._slots.setdefault(fingerprint, loop.create_future())
+            before = []
+            for fingerprint in record.get("refs", {}).values():
+                if fingerprint not in self._issued:
+                    continue
+                self._slots.setdefault(fingerprint, loop.create_future())
+                before.extend(
+                    task for finished, task in users[fingerprint]
+                    if finished <= record["t"]
+                )
+            task = asyncio.ensure_future(self._send(record, before))
+            for fingerprint in record.get("refs", {}).values():
+                users[fingerprint].append(
+                    (record["t"] + (record.get("duration") or 0), task)
+                )
+            tasks.append(task)
+        return await asyncio.gather(*tasks)
+
+    def _server_time_recorder(self, client_loop):
+        """
+        Get a tornado log_function that hands the server-side duration of
+        each replayed request to the replay client, so it is measured the
+        same way as the captured duration.
+        """
+        def record(handler):
+            replay_id = handler.request.headers.get("X-Replay-Id")
+            if replay_id is not None:
+                client_loop.call_soon_threadsafe(
+                    self._set_server_time,
+                    replay_id,
+                    handler.request.request_time(),
+                )
+        return record
+
+    def _set_server_time(self, replay_id: str, duration: float):
+        future = self._server_times.get(replay_id)
+        if future is not None and not future.done():
+            future.set_result(duration)
+
+    def _configure_environment(self, hub_port: int):
+        os.environ.update({
+            "JUPYTERHUB_API_URL": f"http://127.0.0.1:{hub_port}/hub/api",
+            "JUPYTERHUB_API_TOKEN": "replay",
+            "JUPYTERHUB_CLIENT_ID": "service-oidcp",
+            "JUPYTERHUB_SERVICE_NAME": "oidcp",
+            "JUPYTERHUB_SERVICE_PREFIX": SERVICE_PREFIX,
+            "JUPYTERHUB_BASE_URL": "/",
+            "JUPYTERHUB_OAUTH_CALLBACK_URL":
+                SERVICE_PREFIX + "oauth_callback",
+            "JUPYTERHUB_OAUTH_ACCESS_SCOPES": json.dumps(ACCESS_SCOPES),
+            "JUPYTERHUB_HOST": "",
+        })
+
+    def _make_provider_app(self, records: List[dict], port: int):
+        clients = defaultdict(lambda: defaultdict(set))
+        for record in records:
+            client_id = record.get("client_id")
+            redirect_uri = record.get("params", {}).get("redirect_uri")
+            if client_id and redirect_uri and redirect_uri != REDACTED:
+                clients[record.get("issuer", "")][client_id].add(redirect_uri)
+
+        def to_services(issuer_clients):
+            return [
+                {
+                    "oauth_client_id": client_id,
+                    "api_token": CLIENT_SECRET,
+                    "redirect_uris": sorted(redirect_uris),
+                }
+                for client_id, redirect_uris in issuer_clients.items()
+            ]
+
+        return OpenIDConnectProviderApp(
+            base_url=f"http://127.0.0.1:{port}",
+            service_prefix=SERVICE_PREFIX,
+            services=json.dumps(to_services(clients.get("", {}))),
+            issuers=json.dumps([
+                {"prefix": prefix, "services": to_services(issuer_clients)}
+                for prefix, issuer_clients in clients.items() if prefix
+            ]),
+            email_pattern="{uid}@example.com",
+            stall_threshold=0,
+        )
+
+    def _serve(self, provider_app: OpenIDConnectProviderApp, sockets):
+        """
+        Serve the provider on its own event loop in a separate thread,
+        so that the replay client does not share the loop with it.
+        """
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        holder = {}
+
+        def run():
+            asyncio.set_event_loop(loop)
+
+            async def setup():
+                holder["app"] = provider_app._make_app()
+                HTTPServer(holder["app"]).add_sockets(sockets)
+
+            loop.run_until_complete(setup())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return loop, holder["app"]
+
+    async def _send(self, record: dict, before: List[asyncio.Future]):
+        endpoint = record.get("endpoint")
+        result = {
+            "endpoint": endpoint,
+            "original": record.get("duration"),
+            "original_status": record.get("status"),
+            "latency": None,
+            "rtt": None,
+            "status": None,
+            "skip": None,
+        }
+        try:
+            values = {}
+            for name, fingerprint in record.get("refs", {}).items():
+                if fingerprint not in self._issued:
+                    result["skip"] = f"{name} issued before the trace"
+                    return result
+                values[name] = await self._slots[fingerprint]
+            await asyncio.gather(*before)
+            failed = [name for name, value in values.items() if not value]
+            if failed:
+                result["skip"] = f"no {failed[0]} issued in the replay"
+                return result
+            request = self._make_request(record, values)
+            if request is None:
+                result["skip"] = f"missing code or token for {endpoint}"
+                return result
+            replay_id = str(len(self._server_times))
+            request.headers["X-Replay-Id"] = replay_id
+            server_time = asyncio.get_running_loop().create_future()
+            self._server_times[replay_id] = server_time
+            started = time.monotonic()
+            response = await self._client.fetch(request, raise_error=False)
+            result["rtt"] = time.monotonic() - started
+            result["status"] = response.code
+            if response.code != 599:
+                result["latency"] = await asyncio.wait_for(server_time, 5)
+            self._collect(record, response)
+            return result
+        finally:
+            # Never leave the requests that depend on this one waiting
+            for fingerprint in record.get("issued", {}).values():
+                slot = self._slots[fingerprint]
+                if not slot.done():
+                    slot.set_result(None)
+
+    def _make_request(
+        self,
+        record: dict,
+        values: dict,
+    ) -> Optional[HTTPRequest]:
+        endpoint = record.get("endpoint")
+        if endpoint not in ENDPOINT_PATHS:
+            return None
+        issuer = record.get("issuer", "")
+        client_id = record.get("client_id")
+        url = self._base_url + SERVICE_PREFIX + \
+            (f"{issuer}/" if issuer else "") + ENDPOINT_PATHS[endpoint]
+        params = {
+            k: v for k, v in record.get("params", {}).items()
+            if v != REDACTED
+        }
+        headers = {}
+        if endpoint == "AuthorizationHandler":
+            user = f"{USER_TOKEN_PREFIX}{self._user_index % self.users}"
+            self._user_index += 1
+            cookie = create_signed_value(
+                self._cookie_secret, self._cookie_name, user
+            ).decode("utf-8")
+            headers["Cookie"] = f"{self._cookie_name}={cookie}"
+            return HTTPRequest(
+                f"{url}?{urlencode(params)}",
+                headers=headers,
+                follow_redirects=False,
+            )
+        if endpoint in ("TokenHandler", "RevocationHandler"):
+            required = {
+                "TokenHandler": {
+                    "authorization_code": "code",
+                    "refresh_token": "refresh_token",
+                }.get(params.get("grant_type")),
+                "RevocationHandler": "token",
+            }[endpoint]
+            if required is not None:
+                if required not in values:
+                    return None
+                params[required] = values[required]
+            if record.get("auth_scheme") == "Basic":
+                credentials = f"{client_id}:{CLIENT_SECRET}".encode("utf-8")
+                headers["Authorization"] = \
+                    "Basic " + base64.b64encode(credentials).decode("ascii")
+            else:
+                params["client_secret"] = CLIENT_SECRET
+            return HTTPRequest(
+                url,
+                method="POST",
+                headers=headers,
+                body=urlencode(params),
+            )
+        if endpoint == "UserInfoHandler":
+            if "access_token" not in values:
+                return None
+            if record.get("auth_scheme") == "Bearer":
+                headers["Authorization"] = f"Bearer {values['access_token']}"
+            else:
+                params["access_token"] = values["access_token"]
+            return HTTPRequest(f"{url}?{urlencode(params)}", headers=headers)
+        return HTTPRequest(url)
+
+    def _collect(self, record: dict, response):
+        """
+        Hand the codes and tokens issued during the replay to the requests
+        that depend on them.
+        """
+        issued = record.get("issued", {})
+        if not issued:
+            return
+        values = {}
+        if response.code in (302, 303):
+            location = response.headers.get("Location", "")
+            code = parse_qs(urlparse(location).query).get("code")
+            if code:
+                values["code"] = code[0]
+        elif response.code == 200:
+            try:
+                values = json.loads(response.body)
+            except ValueError:
+                values = {}
+        for name, fingerprint in issued.items():
+            slot = self._slots[fingerprint]
+            if not slot.done():
+                slot.set_result(values.get(name))
+
+    def _report(self, results: List[dict]):
+        by_endpoint = defaultdict(list)
+        skipped = Counter()
+        for result in results:
+            by_endpoint[result["endpoint"]].append(result)
+            if result["skip"] is not None:
+                skipped[(result["endpoint"], result["skip"])] += 1
+
+        def ms(value):
+            return "-" if value is None else f"{value * 1000:.1f}"
+
+        print(f"{'endpoint':<28} {'sent':>6} {'skip':>6} {'diff':>6} "
+              f"{'orig p50':>9} {'orig p95':>9} {'orig p99':>9} "
+              f"{'p50':>9} {'p95':>9} {'p99':>9} {'rtt p50':>9}")
+        for endpoint, endpoint_results in sorted(by_endpoint.items()):
+            sent = [r for r in endpoint_results if r["status"] is not None]
+            original = [r["original"] for r in sent if r["original"]]
+            latency = [r["latency"] for r in sent if r["latency"]]
+            rtt = [r["rtt"] for r in sent]
+            mismatched = [
+                r for r in sent if r["status"] != r["original_status"]
+            ]
+            print(f"{endpoint:<28} {len(sent):>6} "
+                  f"{len(endpoint_results) - len(sent):>6} "
+                  f"{len(mismatched):>6} "
+                  f"{ms(percentile(original, 50)):>9} "
+                  f"{ms(percentile(original, 95)):>9} "
+                  f"{ms(percentile(original, 99)):>9} "
+                  f"{ms(percentile(latency, 50)):>9} "
+                  f"{ms(percentile(latency, 95)):>9} "
+                  f"{ms(percentile(latency, 99)):>9} "
+                  f"{ms(percentile(rtt, 50)):>9}")
+        for (endpoint, reason), count in sorted(skipped.items()):
+            self.log.warning("Skipped %d %s requests: %s",
+                             count, endpoint, reason)
+        if skipped:
+            self.exit(1)
+
+
+if __name__ == "__main__":
+    ReplayApp.launch_instance()
@@ -0,0 +1,253 @@
+import fcntl
+import hashlib
+import logging
+import os
+import struct
+import time
+from typing import Dict, Optional
+
+from .audit import audit_event
+
+
+logger = logging.getLogger(__name__)
+_RECORD = struct.Struct("<QQ")
+
+
+class RevocationIndex:
+    """
+    A compact index of revoked tokens.
+
+    Tokens are stored as 64-bit digests with the time at which they would
+    have expired anyway. Expired entries are dropped, so the size of the
+    index is bounded by the number of revocations within a token lifetime.
+
+    When a path is given, revocations are appended to the file as
+    fixed-size records and the file is re-read at most every
+    `refresh_interval` seconds, so processes sharing the file see each
+    other's revocations.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        refresh_interval: float = 1.0,
+        max_entries: int = 100000,
+    ):
+        """
+        Initialize the index.
+
+        :param path: The file to persist the index to. The index is kept
+            in memory only if not set.
+        :param refresh_interval: The minimum number of seconds between two
+            reads of the file.
+        :param max_entries: The number of entries above which expired
+            entries are dropped and the file is compacted.
+        """
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.max_entries = max_entries
+        self._entries: Dict[int, int] = {}
+        self._compact_threshold = max_entries
+        self._fd = None
+        self._inode = None
+        self._offset = 0
+        self._next_refresh = 0.0
+        if path:
+            self._open()
+            self.refresh()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def token_id(token: str) -> int:
+        """
+        Get the 64-bit digest identifying a token or a JWT ID.
+        """
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "little")
+
+    def is_revoked(self, token: str) -> bool:
+        """
+        Check whether a token or a JWT ID was revoked.
+        """
+        if self.path and time.monotonic() >= self._next_refresh:
+            self.refresh()
+        expires_at = self._entries.get(self.token_id(token))
+        return expires_at is not None and expires_at > time.time()
+
+    def revoke(self, token: str, lifetime: float):
+        """
+        Revoke a token or a JWT ID.
+
+        :param token: The token or the JWT ID.
+        :param lifetime: The number of seconds after which the token
+            expires anyway.
+        """
+        token_id = self.token_id(token)
+        expires_at = int(time.time() + lifetime)
+        if self._entries.get(token_id, 0) >= expires_at:
+            return
+        self._entries[token_id] = expires_at
+        if self.path:
+            self._append(token_id, expires_at)
+        if len(self._entries) > self._compact_threshold:
+            self.compact()
+
+    def refresh(self):
+        """
+        Read the revocations appended to the file by other processes.
+        """
+        self._next_refresh = time.monotonic() + self.refresh_interval
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # Removed from outside: start a new file, keep the entries
+            self._open()
+            self._offset = 0
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # The file was compacted by another process
+            self._open()
+            self._entries = {}
+            self._offset = 0
+        if st.st_size > self._offset:
+            self._read()
+
+    def compact(self):
+        """
+        Drop the expired entries and rewrite the file with the live ones.
+        """
+        if self.path:
+            self._lock()
+            try:
+                if os.fstat(self._fd).st_size > self._offset:
+                    self._read()
+                self._prune()
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(b"".join(
+                        _RECORD.pack(token_id, expires_at)
+                        for token_id, expires_at in self._entries.items()
+                    ))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._open()
+            self._offset = os.fstat(self._fd).st_size
+        else:
+            self._prune()
+        self._compact_threshold = max(self.max_entries, 2 * len(self))
+        if len(self) > self.max_entries:
+            logger.warning("Revocation index holds %d unexpired entries, "
+                           "more than %d", len(self), self.max_entries)
+
+    def _prune(self):
+        now = time.time()
+        self._entries = {
+            token_id: expires_at
+            for token_id, expires_at in self._entries.items()
+            if expires_at > now
+        }
+
+    def _open(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(
+            self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600
+        )
+        self._inode = os.fstat(self._fd).st_ino
+
+    def _lock(self):
+        """
+        Lock the file currently at the path, following compactions made
+        by other processes.
+        """
+        while True:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.stat(self.path).st_ino == self._inode:
+                    return
+            except FileNotFoundError:
+                pass
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self.refresh()
+
+    def _append(self, token_id: int, expires_at: int):
+        self._lock()
+        try:
+            # Following a compaction by another process reloads the
+            # entries from the new file, which does not have this one yet
+            if self._entries.get(token_id, 0) < expires_at:
+                self._entries[token_id] = expires_at
+            os.write(self._fd, _RECORD.pack(token_id, expires_at))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _read(self):
+        size = os.fstat(self._fd).st_size
+        size -= (size - self._offset) % _RECORD.size
+        data = os.pread(self._fd, size - self._offset, self._offset)
+        now = time.time()
+        for token_id, expires_at in _RECORD.iter_unpack(data):
+            if expires_at > now and \
+                    self._entries.get(token_id, 0) < expires_at:
+                self._entries[token_id] = expires_at
+        self._offset = size
+
+
+def _token_lifetime(provider, token_type: str) -> float:
+    factory = provider.sdb.token_factory.get(token_type)
+    return getattr(factory, "lifetime", 86400)
+
+
+def find_session(provider, token: str):
+    """
+    Find the session an access token or a refresh token belongs to.
+
+    :return: The session, or None if the token is unknown.
+    """
+    for token_type in ("access_token", "refresh_token"):
+        factory = provider.sdb.token_factory.get(token_type)
+        if factory is None:
+            continue
+        try:
+            session = provider.sdb[factory.get_key(token)]
+        except Exception:
+            continue
+        if session.get(token_type) == token:
+            return session
+    return None
+
+
+def revoke_session(provider, index: RevocationIndex, session: dict):
+    """
+    Revoke the access token and the refresh token of a session.
+    """
+    access_token = session.get("access_token")
+    refresh_token = session.get("refresh_token")
+    if access_token:
+        index.revoke(access_token, _token_lifetime(provider, "access_token"))
+    if refresh_token:
+        index.revoke(
+            refresh_token, _token_lifetime(provider, "refresh_token")
+        )
+    # revoke_all_tokens also revokes the refresh token of the session
+    if access_token:
+        provider.sdb.revoke_all_tokens(access_token)
+    elif refresh_token:
+        provider.sdb.revoke_refresh_token(refresh_token)
+
+
+def revoke_user(provider, index: RevocationIndex, uid: str):
+    """
+    Revoke all the tokens issued to a user.
+    """
+    sids = provider.sdb.get_by_uid(uid)
+    for sid in sids:
+        revoke_session(provider, index, provider.sdb[sid])
+    provider.sdb.revoke_uid(uid)
+    if sids:
+        audit_event("user_tokens_revoked", user=uid, sessions=len(sids))
@@ -1,3 +1,4 @@
 # flake8: noqa
 from .base import UserStore, UserInfo, NoUserError
 from .memory import MemoryUserStore
+from .hubsync import HubUserSync
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Callable, List
 
 
 class UserInfo:
@@ -25,6 +26,9 @@ class NoUserError(Exception):
 
 
 class UserStore(ABC):
+    def __init__(self):
+        self._removal_listeners: List[Callable[[str], None]] = []
+
     @abstractmethod
     def set_user(self, user: UserInfo):
         raise NotImplementedError
@@ -32,3 +36,30 @@ class UserStore(ABC):
     @abstractmethod
     def get_user(self, uid: str) -> UserInfo:
         raise NotImplementedError
+
+    @abstractmethod
+    def get_uids(self) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_user(self, uid: str):
+        """
+        Remove a user and notify the removal listeners.
+        """
+        raise NotImplementedError
+
+    def add_removal_listener(self, listener: Callable[[str], None]):
+        """
+        Call a function with the user ID whenever a user is removed.
+        """
+        self._removal_listeners.append(listener)
+
+    def _notify_removed(self, uid: str):
+        for listener in self._removal_listeners:
+            listener(uid)
+
+    def flush(self):
+        """
+        Write pending changes to persistent storage, if any.
+        """
+        pass
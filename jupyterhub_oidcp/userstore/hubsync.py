@@ -0,0 +1,88 @@
+import json
+import logging
+from urllib.parse import quote
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.ioloop import PeriodicCallback
+
+from .base import UserStore, UserInfo
+
+
+logger = logging.getLogger(__name__)
+
+
+class HubUserSync:
+    """
+    Periodically look up the users of a store in the JupyterHub API,
+    removing the users that were deleted and updating the admin flag
+    of the others.
+
+    The API token needs the `read:users` scope.
+    """
+
+    def __init__(
+        self,
+        userstore: UserStore,
+        api_url: str,
+        api_token: str,
+        interval: float,
+    ):
+        """
+        Initialize the sync.
+
+        :param userstore: The user store to keep in sync.
+        :param api_url: The URL of the JupyterHub API.
+        :param api_token: The API token of the service.
+        :param interval: The number of seconds between two syncs.
+        """
+        self.userstore = userstore
+        self.api_url = api_url.rstrip('/')
+        self.api_token = api_token
+        self.interval = interval
+        self._callback = None
+
+    def start(self):
+        self._callback = PeriodicCallback(self.sync, self.interval * 1000)
+        self._callback.start()
+
+    def stop(self):
+        if self._callback is not None:
+            self._callback.stop()
+            self._callback = None
+
+    async def sync(self):
+        """
+        Look up each user of the store once.
+        """
+        client = AsyncHTTPClient()
+        failures = 0
+        error = None
+        for uid in self.userstore.get_uids():
+            try:
+                response = await client.fetch(
+                    f"{self.api_url}/users/{quote(uid, safe='')}",
+                    headers={"Authorization": f"token {self.api_token}"},
+                    raise_error=False,
+                )
+            except Exception as e:
+                # raise_error=False does not cover connection errors
+                failures += 1
+                error = e
+                continue
+            if response.code == 404:
+                logger.info("User %s was removed from JupyterHub", uid)
+                self.userstore.remove_user(uid)
+            elif response.code == 200:
+                try:
+                    user = UserInfo.from_huboauth_user(
+                        json.loads(response.body)
+                    )
+                except ValueError as e:
+                    logger.warning("Invalid user model for %s: %s", uid, e)
+                    continue
+                self.userstore.set_user(user)
+            else:
+                logger.warning("Failed to look up user %s: %s",
+                               uid, response.code)
+        if failures:
+            logger.warning("Failed to look up %d users: %s", failures, error)
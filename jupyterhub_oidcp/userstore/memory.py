@@ -1,6 +1,7 @@
 from .base import UserStore, UserInfo, NoUserError
 
 import logging
+from typing import List
 
 
 logger = logging.getLogger(__name__)
@@ -8,13 +9,22 @@ logger = logging.getLogger(__name__)
 
 class MemoryUserStore(UserStore):
     def __init__(self):
+        super().__init__()
         self.users = {}
 
     def set_user(self, user: UserInfo):
-        logger.debug(f"MemoryUserStore.set_user: {user}")
+        logger.debug("MemoryUserStore.set_user: %s", user.uid)
         self.users[user.uid] = user
 
     def get_user(self, uid: str) -> UserInfo:
         if uid not in self.users:
             raise NoUserError(f"User {uid} not found.")
         return self.users[uid]
+
+    def get_uids(self) -> List[str]:
+        return list(self.users)
+
+    def remove_user(self, uid: str):
+        logger.debug("MemoryUserStore.remove_user: %s", uid)
+        if self.users.pop(uid, None) is not None:
+            self._notify_removed(uid)
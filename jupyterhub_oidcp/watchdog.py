@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from .metrics import EVENT_LOOP_LAG_SECONDS, EVENT_LOOP_STALLS
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    """
+    Measure the lag of the event loop and capture the stack of callbacks
+    that block it.
+
+    A coroutine on the event loop wakes up every `interval` seconds and
+    records how late it was. A helper thread checks that the coroutine
+    keeps waking up; when it has not for longer than `threshold` seconds,
+    the thread captures the stack of the event loop thread.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        interval: float = 0.1,
+        max_stalls: int = 50,
+        smoothing: float = 0.2,
+    ):
+        """
+        Initialize the watchdog.
+
+        :param threshold: The number of seconds the loop may be blocked
+            before a stall is recorded. 0 only measures the lag.
+        :param interval: The number of seconds between two lag samples.
+        :param max_stalls: The number of recent stalls to keep.
+        :param smoothing: The weight of a new sample in the moving average
+            of the lag.
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.smoothing = smoothing
+        self.stalls = deque(maxlen=max_stalls)
+        self._smoothed_lag = 0.0
+        self._current = None
+        self._last_tick = time.monotonic()
+        self._tick = 0
+        self._reported_tick = -1
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def enter(self, handler: str, method: str, path: str):
+        """
+        Record the request currently being handled on the event loop.
+        """
+        self._current = (handler, method, path)
+
+    def exit(self):
+        """
+        Record that the current request has finished.
+        """
+        self._current = None
+
+    @property
+    def lag(self) -> float:
+        """
+        The smoothed lag of the event loop in seconds, or how late the
+        next sample already is if that is more. 0 if not started.
+        """
+        if self._task is None:
+            return 0.0
+        overdue = time.monotonic() - self._last_tick - self.interval
+        return max(self._smoothed_lag, overdue)
+
+    def start(self):
+        """
+        Start the watchdog. Must be called from the event loop thread.
+        """
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._smoothed_lag = 0.0
+        self._stop.clear()
+        self._task = asyncio.ensure_future(self._measure())
+        if self.threshold <= 0:
+            return
+        self._thread = threading.Thread(
+            target=self._monitor,
+            name="oidcp-watchdog",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info("Started event loop watchdog: threshold=%.3fs",
+                    self.threshold)
+
+    def stop(self):
+        """
+        Stop the watchdog.
+        """
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _measure(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            self._smoothed_lag += self.smoothing * (lag - self._smoothed_lag)
+            if self._reported_tick == self._tick and self.stalls:
+                # The loop is running again: record the total duration
+                self.stalls[-1]["duration"] = lag
+            self._last_tick = now
+            self._tick += 1
+
+    def _monitor(self):
+        period = min(self.interval, self.threshold / 2)
+        while not self._stop.wait(period):
+            tick = self._tick
+            blocked = time.monotonic() - self._last_tick - self.interval
+            if blocked < self.threshold or self._reported_tick == tick:
+                continue
+            self._reported_tick = tick
+            self._record_stall(blocked)
+
+    def _record_stall(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else ""
+        del frame
+        handler, method, path = self._current or (None, None, None)
+        self.stalls.append({
+            "time": time.time(),
+            "duration": blocked,
+            "handler": handler,
+            "method": method,
+            "path": path,
+            "stack": stack,
+        })
+        EVENT_LOOP_STALLS.labels(handler or "").inc()
+        logger.warning(
+            "Event loop blocked for more than %.3fs in %s %s %s\n%s",
+            blocked, handler, method, path, stack,
+        )
+
+    def recent_stalls(self, limit: Optional[int] = None):
+        """
+        Get the most recent stalls, newest first.
+        """
+        stalls = list(self.stalls)[::-1]
+        return stalls[:limit] if limit else stalls
@@ -0,0 +1,113 @@
+import contextlib
+import json
+import logging
+
+import pytest
+from oic.oic.message import AuthorizationRequest
+from oic.utils.sdb import AuthnEvent
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+
+from jupyterhub_oidcp.main import OpenIDConnectProviderApp
+from jupyterhub_oidcp.userstore import UserInfo
+
+
+SERVICES = [
+    {
+        "oauth_client_id": "C1",
+        "api_token": "S1",
+        "redirect_uris": ["http://localhost:9001/cb"],
+    },
+    {
+        "oauth_client_id": "C2",
+        "api_token": "S2",
+        "redirect_uris": ["http://localhost:9002/cb"],
+    },
+]
+
+
+@pytest.fixture
+def make_app(monkeypatch, tmp_path):
+    """
+    Create an initialized OpenIDConnectProviderApp with two services.
+    """
+    monkeypatch.setenv("JUPYTERHUB_BASE_URL", "/")
+    monkeypatch.setenv("JUPYTERHUB_SERVICE_PREFIX", "/services/oidcp/")
+    monkeypatch.setenv("JUPYTERHUB_API_URL", "http://127.0.0.1:1/hub/api")
+    monkeypatch.setenv("JUPYTERHUB_API_TOKEN", "secret")
+
+    def make(*argv):
+        app = OpenIDConnectProviderApp()
+        app.initialize([
+            "--services", json.dumps(SERVICES),
+            "--vault-path", str(tmp_path / "vault"),
+            "--email-pattern", "{uid}@example.com",
+            *argv,
+        ])
+        return app
+    return make
+
+
+@contextlib.asynccontextmanager
+async def serve(web_app):
+    """
+    Serve a tornado application on a free local port and yield its
+    service URL.
+    """
+    sockets = bind_sockets(0, "127.0.0.1")
+    server = HTTPServer(web_app)
+    server.add_sockets(sockets)
+    port = sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/services/oidcp"
+    finally:
+        server.stop()
+        await server.close_all_connections()
+
+
+def issue_tokens(app, uid, client_id="C1"):
+    """
+    Issue an access and a refresh token to a client for a user, as if
+    the authorization code had been exchanged.
+    """
+    provider = app._providers[""]
+    service = next(s for s in SERVICES if s["oauth_client_id"] == client_id)
+    areq = AuthorizationRequest(
+        response_type="code",
+        client_id=client_id,
+        redirect_uri=service["redirect_uris"][0],
+        scope=["openid"],
+        state="state",
+    )
+    sid = provider.sdb.create_authz_session(AuthnEvent(uid, "salt"), areq)
+    provider.sdb.do_sub(sid, "")
+    app._userstore.set_user(UserInfo(uid, admin=False))
+    return provider.sdb.upgrade_to_token(
+        provider.sdb[sid]["code"], issue_refresh=True
+    )
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def audit_records():
+    """
+    Collect the audit records emitted during a test.
+    """
+    handler = _ListHandler()
+    audit_logger = logging.getLogger("jupyterhub_oidcp.audit")
+    level = audit_logger.level
+    audit_logger.setLevel(logging.INFO)
+    audit_logger.addHandler(handler)
+    try:
+        yield handler.records
+    finally:
+        audit_logger.removeHandler(handler)
+        audit_logger.setLevel(level)
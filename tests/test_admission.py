@@ -0,0 +1,82 @@
+import asyncio
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from jupyterhub_oidcp.admission import AdmissionController
+
+from conftest import serve
+
+
+TOKEN_BODY = (
+    b"grant_type=authorization_code&code=unknown&client_id=C1"
+    b"&redirect_uri=http%3A%2F%2Flocalhost%3A9001%2Fcb"
+)
+
+
+def _fetch(url, body=None, delay=0.0):
+    time.sleep(delay)
+    request = urllib.request.Request(url, data=body)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers
+
+
+def _requests_across_stall(app, block):
+    """
+    Send token, discovery and JWKS requests while the event loop is
+    blocked for `block` seconds, so that they wait in the socket backlog.
+    """
+    async def run():
+        web_app = app._make_app()
+        app._watchdog.start()
+        try:
+            async with serve(web_app) as url:
+                await asyncio.sleep(0.3)
+                loop = asyncio.get_running_loop()
+                requests = [(f"{url}/token", TOKEN_BODY)] * 5 + [
+                    (f"{url}/.well-known/openid-configuration", None),
+                    (f"{url}/jwks.json", None),
+                ]
+                with ThreadPoolExecutor(len(requests)) as executor:
+                    futures = [
+                        loop.run_in_executor(
+                            executor, _fetch, request_url, body, 0.1
+                        )
+                        for request_url, body in requests
+                    ]
+                    time.sleep(block)
+                    return await asyncio.gather(*futures)
+        finally:
+            app._watchdog.stop()
+    return asyncio.run(run())
+
+
+def test_sheds_expensive_requests_queued_behind_a_stall(make_app):
+    app = make_app("--max-queue-delay=0.05")
+    responses = _requests_across_stall(app, 1.0)
+    token, (discovery, _), (jwks, _) = responses[:5], *responses[5:]
+    assert discovery == 200
+    assert jwks == 200
+    for status, headers in token:
+        assert status == 503
+        assert headers["Retry-After"] == "1"
+    assert app._admission.shed_counts[("expensive", "queue_delay")] == 5
+
+
+def test_admits_requests_without_a_limit(make_app):
+    app = make_app()
+    responses = _requests_across_stall(app, 1.0)
+    assert [status for status, _ in responses] == [401] * 5 + [200, 200]
+
+
+def test_admit():
+    controller = AdmissionController(max_queue_delay=0.05)
+    assert controller.admit("expensive", 0.01) is None
+    assert controller.admit("cheap", 1.0) is None
+    assert controller.admit("expensive", 1.0) == "queue_delay"
+    assert controller.shed_counts == {("expensive", "queue_delay"): 1}
+    assert AdmissionController().admit("expensive", 1.0) is None
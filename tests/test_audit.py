@@ -0,0 +1,140 @@
+import json
+import logging
+import queue
+import sys
+import threading
+
+from jupyterhub_oidcp.audit import (
+    REDACTED,
+    BoundedQueueHandler,
+    JSONFormatter,
+    SamplingFilter,
+    is_sensitive_key,
+    redact,
+    redact_text,
+)
+
+
+def _record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord(
+        "test", level, __file__, 1, msg, args, None
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+def test_is_sensitive_key():
+    for key in ["client_secret", "api_token", "Authorization", "cookie",
+                "access_token", "refresh_token", "id_token", "token",
+                "code", "d", "qi"]:
+        assert is_sensitive_key(key), key
+    for key in ["client_id", "redirect_uri", "user", "status", "kid"]:
+        assert not is_sensitive_key(key), key
+
+
+def test_redact_nested():
+    value = {
+        "client_id": "C1",
+        "params": {"code": "abc", "state": "s"},
+        "keys": [{"kty": "RSA", "d": "private", "n": "public"}],
+        "status": 200,
+    }
+    assert redact(value) == {
+        "client_id": "C1",
+        "params": {"code": REDACTED, "state": "s"},
+        "keys": [{"kty": "RSA", "d": REDACTED, "n": "public"}],
+        "status": 200,
+    }
+
+
+def test_redact_text_query_string():
+    text = "code=abc123&state=xyz&client_secret=s3cr3t"
+    assert redact_text(text) == (
+        f"code={REDACTED}&state=xyz&client_secret={REDACTED}"
+    )
+
+
+def test_redact_text_json():
+    text = '{"access_token": "tok", "token_type": "Bearer"}'
+    redacted = redact_text(text)
+    assert "tok\"" not in redacted
+    assert f'"access_token": "{REDACTED}"' in redacted
+    assert '"token_type": "Bearer"' in redacted
+
+
+def test_redact_text_authorization_headers():
+    assert redact_text("Authorization: Bearer abc.def-ghi") == (
+        f"Authorization: Bearer {REDACTED}"
+    )
+    assert redact_text("Basic QzE6UzE=") == f"Basic {REDACTED}"
+
+
+def test_redact_text_hub_cookie():
+    text = 'cookie jupyterhub:{"name": "alice", "admin": true}'
+    assert redact_text(text) == f"cookie jupyterhub:{REDACTED}"
+
+
+def test_json_formatter_redacts_audit_fields():
+    record = _record(
+        "token_issued",
+        audit=True,
+        audit_fields={"client_id": "C1", "code": "abc"},
+    )
+    doc = json.loads(JSONFormatter().format(record))
+    assert doc["audit"] is True
+    assert doc["client_id"] == "C1"
+    assert doc["code"] == REDACTED
+
+
+def test_sampling_filter_keeps_audit_and_warnings():
+    sampling = SamplingFilter(0.0)
+    assert not sampling.filter(_record("debug", level=logging.DEBUG))
+    assert sampling.filter(_record("warn", level=logging.WARNING))
+    assert sampling.filter(_record("audit", audit=True))
+
+
+def test_queue_handler_formats_before_queueing():
+    class Mutable:
+        v = "before"
+
+        def __str__(self):
+            return self.v
+
+    m = Mutable()
+    log_queue = queue.Queue()
+    handler = BoundedQueueHandler(log_queue)
+    handler.handle(_record("mut %s", m))
+    m.v = "after"
+    record = log_queue.get_nowait()
+    assert record.getMessage() == "mut before"
+    assert record.args is None
+
+
+def test_queue_handler_releases_exc_info():
+    try:
+        raise RuntimeError("boom client_secret=s3cr3t")
+    except RuntimeError:
+        record = _record("failed")
+        record.exc_info = sys.exc_info()
+    log_queue = queue.Queue()
+    BoundedQueueHandler(log_queue).handle(record)
+    queued = log_queue.get_nowait()
+    assert queued.exc_info is None
+    doc = json.loads(JSONFormatter().format(queued))
+    assert "RuntimeError" in doc["exc_info"]
+    assert "s3cr3t" not in doc["exc_info"]
+
+
+def test_queue_handler_drops_only_non_audit_records():
+    log_queue = queue.Queue(1)
+    handler = BoundedQueueHandler(log_queue)
+    handler.handle(_record("first"))
+    handler.handle(_record("dropped"))
+    assert log_queue.qsize() == 1
+
+    # Audit records wait for the writer instead of being dropped
+    writer = threading.Timer(0.1, log_queue.get_nowait)
+    writer.start()
+    handler.handle(_record("audit", audit=True))
+    writer.join()
+    assert log_queue.get_nowait().getMessage() == "audit"
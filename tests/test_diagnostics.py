@@ -0,0 +1,69 @@
+import asyncio
+import json
+import tracemalloc
+
+import pytest
+from tornado.httpclient import AsyncHTTPClient
+
+from jupyterhub_oidcp.diagnostics import MAX_TOP_ALLOCATIONS
+from jupyterhub_oidcp.handlers.base import BaseAdminHandler
+
+from conftest import serve
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(
+        BaseAdminHandler, "get_current_user",
+        lambda self: {"name": "admin", "admin": True},
+    )
+
+
+@pytest.fixture
+def tracing():
+    yield
+    tracemalloc.stop()
+
+
+def _get(app, *queries):
+    async def run():
+        async with serve(app._make_app()) as url:
+            client = AsyncHTTPClient()
+            return [
+                await client.fetch(
+                    f"{url}/diagnostics/memory?{query}", raise_error=False
+                )
+                for query in queries
+            ]
+    return asyncio.run(run())
+
+
+def test_rejects_bad_limits(make_app, admin):
+    responses = _get(make_app(), "limit=-1", "limit=0", "limit=x", "limit=1")
+    assert [r.code for r in responses] == [400, 400, 400, 200]
+    assert json.loads(responses[-1].body)["tracemalloc"] is None
+
+
+def test_caps_limit(make_app, admin, tracing):
+    app = make_app("--tracemalloc-frames=1")
+    response, = _get(app, "limit=100000&key_type=filename")
+    assert response.code == 200
+    top = json.loads(response.body)["tracemalloc"]["top"]
+    assert 0 < len(top) <= MAX_TOP_ALLOCATIONS
+
+
+def test_runs_one_report_at_a_time(make_app, tracing):
+    app = make_app("--tracemalloc-frames=1")
+    app._make_app()
+    diagnostics = app._web_app.settings["memory_diagnostics"]
+
+    async def run():
+        return await asyncio.gather(
+            diagnostics.top_allocations(limit=1),
+            diagnostics.take_snapshot(),
+            return_exceptions=True,
+        )
+    report, error = asyncio.run(run())
+    assert len(report["top"]) == 1
+    assert isinstance(error, RuntimeError)
+    assert diagnostics.baseline is None
@@ -0,0 +1,82 @@
+import asyncio
+from urllib.parse import urlencode
+
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+
+from jupyterhub_oidcp.inflight import InflightTracker
+
+
+async def _wait_for(condition, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_drain_completes_partially_received_request(make_app):
+    app = make_app()
+    body = urlencode(dict(
+        grant_type="authorization_code",
+        code="unknown",
+        redirect_uri="http://localhost:9001/cb",
+        client_id="C1",
+    )).encode()
+    headers = (
+        b"POST /services/oidcp/token HTTP/1.1\r\n"
+        b"Host: localhost\r\n"
+        b"Content-Type: application/x-www-form-urlencoded\r\n"
+        b"Content-Length: %d\r\n\r\n" % len(body)
+    )
+
+    async def run():
+        tracker = InflightTracker(app._make_app())
+        server = HTTPServer(tracker)
+        sockets = bind_sockets(0, "127.0.0.1")
+        server.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+        idle_reader, _ = await asyncio.open_connection("127.0.0.1", port)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(headers + body[:10])
+        await writer.drain()
+        await _wait_for(lambda: tracker.total == 1)
+
+        server.stop()
+        server.conn_params.no_keep_alive = True
+        drain = asyncio.ensure_future(tracker.drain(5))
+        assert await asyncio.wait_for(idle_reader.read(), 5) == b""
+        await asyncio.sleep(0.2)
+        assert not drain.done()
+
+        writer.write(body[10:])
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        assert response.startswith(b"HTTP/1.1 401 ")
+        assert await drain
+        assert tracker.total == 0
+        writer.close()
+    asyncio.run(run())
+
+
+def test_drain_times_out_on_stalled_upload(make_app):
+    app = make_app()
+
+    async def run():
+        tracker = InflightTracker(app._make_app())
+        server = HTTPServer(tracker)
+        sockets = bind_sockets(0, "127.0.0.1")
+        server.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+        _, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            b"POST /services/oidcp/token HTTP/1.1\r\n"
+            b"Host: localhost\r\nContent-Length: 100\r\n\r\n"
+        )
+        await writer.drain()
+        await _wait_for(lambda: tracker.total == 1)
+        server.stop()
+        assert not await tracker.drain(0.2)
+        await server.close_all_connections()
+        assert tracker.total == 0
+        writer.close()
+    asyncio.run(run())
@@ -0,0 +1,208 @@
+import asyncio
+import base64
+import os
+from urllib.parse import urlencode
+
+import pytest
+from tornado.httpclient import AsyncHTTPClient
+
+from jupyterhub_oidcp.revocation import RevocationIndex
+
+from conftest import issue_tokens, serve
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "revoked.idx")
+
+
+def test_in_memory():
+    index = RevocationIndex()
+    index.revoke("t1", 60)
+    index.revoke("t2", -1)
+    assert index.is_revoked("t1")
+    assert not index.is_revoked("t2")
+    assert not index.is_revoked("t3")
+
+
+def test_revoke_keeps_later_expiry():
+    index = RevocationIndex()
+    index.revoke("t1", 60)
+    index.revoke("t1", -1)
+    assert index.is_revoked("t1")
+
+
+def test_shared_file(path):
+    a = RevocationIndex(path, refresh_interval=0)
+    b = RevocationIndex(path, refresh_interval=0)
+    a.revoke("t1", 60)
+    assert b.is_revoked("t1")
+    b.revoke("t2", 60)
+    assert a.is_revoked("t2")
+    assert os.path.getsize(path) == 2 * 16
+
+
+def test_loads_existing_file(path):
+    RevocationIndex(path).revoke("t1", 60)
+    assert RevocationIndex(path).is_revoked("t1")
+
+
+def test_refresh_interval(path):
+    a = RevocationIndex(path, refresh_interval=3600)
+    b = RevocationIndex(path, refresh_interval=0)
+    b.revoke("t1", 60)
+    assert not a.is_revoked("t1")
+    a.refresh()
+    assert a.is_revoked("t1")
+
+
+def test_partial_record_is_read_once_complete(path):
+    index = RevocationIndex(path, refresh_interval=0)
+    record = RevocationIndex(path)
+    record.revoke("t1", 60)
+    data = open(path, "rb").read()
+    os.truncate(path, 0)
+    index.refresh()
+    with open(path, "ab") as f:
+        f.write(data[:10])
+    assert not index.is_revoked("t1")
+    with open(path, "ab") as f:
+        f.write(data[10:])
+    assert index.is_revoked("t1")
+
+
+def test_compaction_drops_expired_entries(path):
+    index = RevocationIndex(path, refresh_interval=0, max_entries=4)
+    for i in range(3):
+        index.revoke(f"expired{i}", -1)
+    index.revoke("live0", 60)
+    index.revoke("live1", 60)
+    assert os.path.getsize(path) == 2 * 16
+    assert len(index) == 2
+    assert index.is_revoked("live0")
+    assert index.is_revoked("live1")
+
+
+def test_follows_compaction_by_another_process(path):
+    a = RevocationIndex(path, refresh_interval=0, max_entries=2)
+    b = RevocationIndex(path, refresh_interval=0)
+    a.revoke("expired", -1)
+    a.revoke("live0", 60)
+    inode = os.stat(path).st_ino
+    a.revoke("live1", 60)
+    assert os.stat(path).st_ino != inode
+    assert b.is_revoked("live0")
+    assert b.is_revoked("live1")
+    assert not b.is_revoked("expired")
+    assert len(b) == 2
+
+
+def test_revoke_after_compaction_by_another_process(path):
+    a = RevocationIndex(path, refresh_interval=3600, max_entries=1)
+    b = RevocationIndex(path, refresh_interval=3600)
+    a.revoke("t1", 60)
+    a.revoke("t2", 60)
+    # b still has the file from before the compaction open
+    b.revoke("t3", 60)
+    assert b.is_revoked("t3")
+    assert b.is_revoked("t1")
+    a.refresh()
+    assert a.is_revoked("t3")
+    assert os.path.getsize(path) == 3 * 16
+
+
+def test_file_removed(path):
+    index = RevocationIndex(path, refresh_interval=0)
+    index.revoke("t1", 60)
+    os.remove(path)
+    index.revoke("t2", 60)
+    assert index.is_revoked("t1")
+    assert index.is_revoked("t2")
+    assert RevocationIndex(path).is_revoked("t2")
+
+
+def _basic(client_id, secret):
+    credentials = f"{client_id}:{secret}".encode()
+    return "Basic " + base64.b64encode(credentials).decode()
+
+
+async def _userinfo(url, access_token):
+    response = await AsyncHTTPClient().fetch(
+        f"{url}/userinfo",
+        headers={"Authorization": f"Bearer {access_token}"},
+        raise_error=False,
+    )
+    return response.code
+
+
+async def _revoke(url, authorization=None, **params):
+    headers = {}
+    if authorization:
+        headers["Authorization"] = authorization
+    response = await AsyncHTTPClient().fetch(
+        f"{url}/revocation",
+        method="POST",
+        headers=headers,
+        body=urlencode(params),
+        raise_error=False,
+    )
+    return response.code
+
+
+@pytest.mark.parametrize("hint", ["access_token", "refresh_token"])
+def test_revoked_session_is_rejected_by_userinfo(make_app, hint):
+    app = make_app()
+
+    async def run():
+        web_app = app._make_app()
+        tokens = issue_tokens(app, "alice")
+        async with serve(web_app) as url:
+            before = await _userinfo(url, tokens["access_token"])
+            revoked = await _revoke(
+                url, _basic("C1", "S1"),
+                token=tokens[hint], token_type_hint=hint,
+            )
+            after = await _userinfo(url, tokens["access_token"])
+        return tokens, (before, revoked, after)
+    tokens, codes = asyncio.run(run())
+    assert codes == (200, 200, 401)
+    # Revoking either token of a session revokes both
+    assert app._revocation_index.is_revoked(tokens["access_token"])
+    assert app._revocation_index.is_revoked(tokens["refresh_token"])
+
+
+def test_revocation_requires_the_owning_client(make_app):
+    app = make_app()
+
+    async def run():
+        web_app = app._make_app()
+        tokens = issue_tokens(app, "alice")
+        async with serve(web_app) as url:
+            codes = [
+                await _revoke(url, _basic("C1", "wrong"),
+                              token=tokens["access_token"]),
+                await _revoke(url, _basic("C2", "S2"),
+                              token=tokens["access_token"]),
+                await _revoke(url, token=tokens["access_token"],
+                              client_id="C1", client_secret="S1"),
+                await _revoke(url, _basic("C1", "S1"), token="unknown"),
+            ]
+            codes.append(await _userinfo(url, tokens["access_token"]))
+        return codes
+    assert asyncio.run(run()) == [401, 400, 200, 200, 401]
+
+
+def test_removed_user_is_rejected_by_userinfo(make_app):
+    app = make_app()
+
+    async def run():
+        web_app = app._make_app()
+        alice = issue_tokens(app, "alice")
+        bob = issue_tokens(app, "bob")
+        async with serve(web_app) as url:
+            app._userstore.remove_user("bob")
+            return (
+                await _userinfo(url, alice["access_token"]),
+                await _userinfo(url, bob["access_token"]),
+            )
+    assert asyncio.run(run()) == (200, 401)
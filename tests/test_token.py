@@ -0,0 +1,95 @@
+import asyncio
+import json
+from urllib.parse import urlencode
+
+from oic.oic.message import AuthorizationRequest
+from oic.utils.sdb import AuthnEvent
+from tornado.httpclient import AsyncHTTPClient
+
+from conftest import serve
+
+
+def _token_request(app, **params):
+    async def request():
+        async with serve(app._make_app()) as url:
+            return await AsyncHTTPClient().fetch(
+                f"{url}/token",
+                method="POST",
+                body=urlencode(params),
+                raise_error=False,
+            )
+    return asyncio.run(request())
+
+
+def _events(records):
+    return [(r.getMessage(), r.audit_fields) for r in records]
+
+
+def test_unknown_redirect_uri_is_audited_once(make_app, audit_records):
+    response = _token_request(
+        make_app(),
+        grant_type="authorization_code",
+        code="unknown",
+        redirect_uri="http://localhost:9999/cb",
+        client_id="C1",
+    )
+    assert response.code == 401
+    assert json.loads(response.body)["error"] == "unauthorized_client"
+    events = _events(audit_records)
+    assert [event for event, _ in events] == ["client_auth_failure"]
+    fields = events[0][1]
+    assert fields["redirect_uri"] == "http://localhost:9999/cb"
+    assert fields["client_id"] == "C1"
+
+
+def test_unknown_code_is_audited_once(make_app, audit_records):
+    response = _token_request(
+        make_app(),
+        grant_type="authorization_code",
+        code="unknown",
+        redirect_uri="http://localhost:9001/cb",
+        client_id="C1",
+    )
+    assert response.code == 401
+    events = _events(audit_records)
+    assert [event for event, _ in events] == ["token_request_rejected"]
+    assert events[0][1]["reason"] == "unauthorized_client"
+    assert events[0][1]["status"] == 401
+
+
+def test_token_issued_is_audited_once(make_app, audit_records):
+    app = make_app()
+
+    async def request():
+        web_app = app._make_app()
+        provider = app._providers[""]
+        areq = AuthorizationRequest(
+            response_type="code",
+            client_id="C1",
+            redirect_uri="http://localhost:9001/cb",
+            scope=["openid"],
+            state="state",
+        )
+        sid = provider.sdb.create_authz_session(
+            AuthnEvent("alice", "salt"), areq
+        )
+        provider.sdb.do_sub(sid, "")
+        async with serve(web_app) as url:
+            return await AsyncHTTPClient().fetch(
+                f"{url}/token",
+                method="POST",
+                body=urlencode(dict(
+                    grant_type="authorization_code",
+                    code=provider.sdb[sid]["code"],
+                    redirect_uri="http://localhost:9001/cb",
+                    client_id="C1",
+                    client_secret="S1",
+                )),
+                raise_error=False,
+            )
+    response = asyncio.run(request())
+    assert response.code == 200, response.body
+    assert "access_token" in json.loads(response.body)
+    assert [event for event, _ in _events(audit_records)] == [
+        "token_issued"
+    ]
@@ -0,0 +1,69 @@
+import asyncio
+import socket
+
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+
+from jupyterhub_oidcp.userstore import HubUserSync, MemoryUserStore, UserInfo
+
+
+class StandInUserHandler(RequestHandler):
+    def get(self, name):
+        if name == "removed":
+            self.set_status(404)
+            self.finish({"message": "Not found"})
+            return
+        self.finish({"kind": "user", "name": name, "admin": True})
+
+
+def _store(*uids):
+    store = MemoryUserStore()
+    for uid in uids:
+        store.set_user(UserInfo(uid, admin=False))
+    removed = []
+    store.add_removal_listener(removed.append)
+    return store, removed
+
+
+def test_remove_user_notifies_listeners():
+    store, removed = _store("alice")
+    store.remove_user("alice")
+    store.remove_user("unknown")
+    assert removed == ["alice"]
+    assert store.get_uids() == []
+
+
+def test_sync_removes_deleted_users():
+    store, removed = _store("alice", "removed")
+
+    async def sync():
+        sockets = bind_sockets(0, "127.0.0.1")
+        port = sockets[0].getsockname()[1]
+        server = HTTPServer(Application([
+            (r"/hub/api/users/(.*)", StandInUserHandler),
+        ]))
+        server.add_sockets(sockets)
+        try:
+            await HubUserSync(
+                store, f"http://127.0.0.1:{port}/hub/api", "token", 1
+            ).sync()
+        finally:
+            server.stop()
+
+    asyncio.run(sync())
+    assert removed == ["removed"]
+    assert store.get_uids() == ["alice"]
+    assert store.get_user("alice").admin
+
+
+def test_sync_survives_unreachable_hub():
+    store, removed = _store("alice", "bob")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    asyncio.run(HubUserSync(
+        store, f"http://127.0.0.1:{port}/hub/api", "token", 1
+    ).sync())
+    assert removed == []
+    assert sorted(store.get_uids()) == ["alice", "bob"]
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+
+from jupyterhub_oidcp.handlers.base import BaseAdminHandler
+
+from conftest import serve
+
+
+def test_blocking_handler_records_a_stall(make_app, monkeypatch):
+    monkeypatch.setattr(
+        BaseAdminHandler, "get_current_user",
+        lambda self: {"name": "admin", "admin": True},
+    )
+    app = make_app(
+        "--stall-threshold=0.2",
+        "--OpenIDConnectProviderApp.watchdog_interval=0.05",
+    )
+    web_app = app._make_app()
+    provider = app._providers[""]
+    token_endpoint = provider.token_endpoint
+
+    def slow_token_endpoint(**kwargs):
+        time.sleep(0.5)
+        return token_endpoint(**kwargs)
+    monkeypatch.setattr(provider, "token_endpoint", slow_token_endpoint)
+
+    async def run():
+        app._watchdog.start()
+        try:
+            async with serve(web_app) as url:
+                client = AsyncHTTPClient()
+                await client.fetch(
+                    f"{url}/token",
+                    method="POST",
+                    body="grant_type=authorization_code&code=unknown"
+                         "&redirect_uri=http%3A%2F%2Flocalhost%3A9001%2Fcb",
+                    raise_error=False,
+                )
+                await asyncio.sleep(0.2)
+                response = await client.fetch(
+                    f"{url}/diagnostics/loop?limit=5"
+                )
+                bad_limit = await client.fetch(
+                    f"{url}/diagnostics/loop?limit=0", raise_error=False
+                )
+                return json.loads(response.body), bad_limit.code
+        finally:
+            app._watchdog.stop()
+    report, bad_limit = asyncio.run(run())
+    assert bad_limit == 400
+    assert report["stall_threshold"] == 0.2
+    assert len(report["stalls"]) == 1
+    stall = report["stalls"][0]
+    assert stall["handler"] == "TokenHandler"
+    assert stall["method"] == "POST"
+    assert stall["path"] == "/services/oidcp/token"
+    assert "slow_token_endpoint" in stall["stack"]
+    assert stall["duration"] >= 0.4